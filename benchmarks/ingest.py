@@ -0,0 +1,86 @@
+"""Benchmark reflog ingestion, ensuring hashing and parsing entries grows linearly
+with the number of entries ingested, and measuring the memory held by the parsed entries.
+
+Run from the root of the repository:
+
+    python -m benchmarks.ingest
+"""
+import time
+import tracemalloc
+
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+
+from src.conf.conf import (
+    TIMESTAMP_FORMAT,
+)
+from src.parse import (
+    RepositoryParser,
+)
+
+# The number of distinct branches checked out.
+BRANCHES = 25
+
+SIZES = [
+    1_000,
+    10_000,
+    100_000,
+    1_000_000,
+]
+# The number of entries used when measuring memory, tracing
+# every allocation is slow, so a single moderate size is used.
+MEMORY_SIZE = 10_000
+
+
+def generate_reflog(size):
+    """Generate ``size`` synthetic "checkout" reflog entries, one minute apart.
+    """
+    start = datetime(2021, 1, 1, tzinfo=timezone(timedelta(hours=-3)))
+
+    # Refs move between a handful of branches, as they do in real repositories.
+    return [
+        (
+            f"{i:010x} HEAD@{{{(start + timedelta(minutes=i)).strftime(TIMESTAMP_FORMAT)}}}: "
+            f"checkout: moving from feature/WD-{i % BRANCHES} to feature/WD-{(i + 1) % BRANCHES}"
+        )
+        for i in range(size)
+    ]
+
+
+def main():
+    print(f"{'entries':>10} {'seconds':>10} {'us/entry':>10}")
+
+    for size in SIZES:
+        reflog = generate_reflog(size=size)
+        # The repository is never parsed, only used to key the
+        # parser, so no tracked data is loaded or written.
+        parser = RepositoryParser(repository=f"benchmark-{size}")
+
+        start = time.perf_counter()
+        parser._make_parsed(
+            hashes=parser._make_hashes(reflog),
+        )
+        elapsed = time.perf_counter() - start
+
+        print(f"{size:>10} {elapsed:>10.3f} {elapsed / size * 1_000_000:>10.2f}")
+
+    # Memory is measured separately so tracing doesn't skew the timings, only
+    # what the parser still holds once the raw entries are released is counted.
+    reflog = generate_reflog(size=MEMORY_SIZE)
+    parser = RepositoryParser(repository=f"benchmark-{MEMORY_SIZE}")
+
+    tracemalloc.start()
+    parser._make_parsed(
+        hashes=parser._make_hashes(reflog),
+    )
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"\n{held / MEMORY_SIZE:.0f} bytes held per parsed entry ({MEMORY_SIZE} entries).")
+
+
+if __name__ == "__main__":
+    main()
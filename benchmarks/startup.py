@@ -0,0 +1,91 @@
+"""Benchmark application startup, measuring the import time of ``src.workday`` and ensuring
+the menu can be built before any of the network or authentication machinery is loaded.
+
+Run from the root of the repository:
+
+    python -m benchmarks.startup
+"""
+import sys
+import json
+import subprocess
+
+# Modules that should never be loaded before the tray icon is shown, these are only
+# loaded once the external managers are first used (in the background once running).
+HEAVY_MODULES = [
+    "O365",
+    "atlassian",
+    "requests",
+    "oauthlib",
+    "requests_oauthlib",
+    "bs4",
+    "dateutil",
+]
+# The number of slowest imports listed.
+SLOWEST = 10
+
+STARTUP = """
+import sys
+import json
+from src.app.menus import generate_menu
+generate_menu()
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def import_times(module):
+    """Import a ``module`` in a fresh interpreter with "-X importtime", returning a list
+    of (<cumulative_us>, <module>) tuples for every module imported.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append(
+            (int(cumulative), name.strip()),
+        )
+    return times
+
+
+def startup_modules():
+    """Build the menu in a fresh interpreter, returning every module loaded by doing so.
+    """
+    process = subprocess.run(
+        [sys.executable, "-c", STARTUP],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def main():
+    times = import_times(module="src.workday")
+    total = dict((name, cumulative) for cumulative, name in times)["src.workday"]
+
+    print(f"src.workday imported in {total / 1000:.1f}ms\n")
+    print(f"{'cumulative ms':>14} module")
+
+    for cumulative, name in sorted(times, reverse=True)[:SLOWEST]:
+        print(f"{cumulative / 1000:>14.1f} {name}")
+
+    loaded = [
+        module for module in startup_modules() if module.split(".")[0] in HEAVY_MODULES
+    ]
+    if loaded:
+        print(f"\nLoaded before the menu was shown: {', '.join(sorted(set(m.split('.')[0] for m in loaded)))}")
+        sys.exit(1)
+
+    print("\nNo network or authentication modules were loaded before the menu was shown.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import threading
+
 from rumps import (
     App,
     alert,
@@ -23,24 +25,127 @@ from src.app.menus import (
     build_outlook_menu,
     build_jira_menu,
 )
+from src.app.scheduler import (
+    Scheduler,
+)
+from src.external import (
+    outlook_manager,
+    jira_manager,
+)
+from src.conf.config import (
+    config,
+    cache,
+)
+from src.parse import (
+    parse_repositories,
+)
+from src.watch import (
+    RepositoryWatcher,
+)
+
+# The configuration (and cache) keys each refreshed menu depends on, the Outlook
+# token determines the authentication state and the calendars available.
+REPOSITORIES_KEYS = {
+    "repositories",
+}
+OPTIONS_KEYS = {
+    "itinerary_type",
+    "minimum_event_duration",
+    "hardcoded_start_time",
+    "hardcoded_end_time",
+    "parse_interval",
+    "outlook_sync_time",
+    "outlook_calendar",
+    "outlook_token",
+    "debug_mode",
+    "calendars",
+}
+OUTLOOK_KEYS = {
+    "outlook_token",
+}
+JIRA_KEYS = {
+    "jira_enabled",
+}
 
 
 class WorkDayApp(App):
+    def __init__(self, *args, **kwargs):
+        """Initialize a new WorkDayApp, starting the background scheduler and watcher used
+        to keep tracked repositories parsed without blocking the menu, the external managers
+        are loaded in the background too.
+        """
+        super().__init__(*args, **kwargs)
+
+        # Configuration keys updated since the menu was last refreshed,
+        # only menus that depend on one of these keys are rebuilt.
+        self.changed = set()
+        self.changed_lock = threading.Lock()
+        config.listen(self.config_changed)
+        cache.listen(self.config_changed)
+
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+        self.watcher = RepositoryWatcher(
+            callback=self.parse_changed,
+        )
+        self.watcher.start()
+
+        threading.Thread(
+            target=self.load_external,
+            daemon=True,
+        ).start()
+
+    def load_external(self):
+        """Load the external managers in the background once the app is running, so the menu is
+        available right away, the menus depending on the managers are rebuilt once they're loaded.
+        """
+        outlook_manager.load()
+        jira_manager.load()
+
+        self.config_changed(OUTLOOK_KEYS | OPTIONS_KEYS)
+
+    @staticmethod
+    def parse_changed(repositories):
+        """Parse the ``repositories`` whose reflog has changed, called from the watcher's thread.
+        """
+        parse_repositories(
+            repositories=repositories,
+            workers=config.parse_workers,
+        )
+
+    def config_changed(self, keys):
+        """Mark the configuration ``keys`` specified as changed, the menus depending on them
+        are rebuilt on the next refresh, this can be called from any thread.
+        """
+        with self.changed_lock:
+            self.changed.update(keys)
+
     @timer(5)
     def refresh_menu(self, sender):
         """Refresh the menu on a timer.
 
+        Only the menus that depend on configuration that has changed since the last refresh
+        are rebuilt, when nothing has changed, the refresh does nothing at all.
+
         Note: It'd be nice here to just run this whenever the menu is clicked on and shown,
               this is an issue slated within the rumps repository, if this becomes possible,
               update our menu with "dynamic" data on menu show. instead of on a timer.
         """
+        with self.changed_lock:
+            changed, self.changed = self.changed, set()
+
+        if not changed:
+            return
+
         for refresh_spec in [
-            (REPOSITORIES, TOOLS, build_tracked_repos_menu, self.menu.insert_before),
-            (OPTIONS, TOOLS, build_options_menu, self.menu.insert_after),
-            (OUTLOOK, ABOUT, build_outlook_menu, self.menu.insert_before),
-            (JIRA, OUTLOOK, build_jira_menu, self.menu.insert_after),
+            (REPOSITORIES, TOOLS, build_tracked_repos_menu, self.menu.insert_before, REPOSITORIES_KEYS),
+            (OPTIONS, TOOLS, build_options_menu, self.menu.insert_after, OPTIONS_KEYS),
+            (OUTLOOK, ABOUT, build_outlook_menu, self.menu.insert_before, OUTLOOK_KEYS),
+            (JIRA, OUTLOOK, build_jira_menu, self.menu.insert_after, JIRA_KEYS),
         ]:
-            # (<menu>, <insert>, <menu_cb>, <insert_func>)
+            # (<menu>, <insert>, <menu_cb>, <insert_func>, <keys>)
+            if changed.isdisjoint(refresh_spec[4]):
+                continue
             self.menu.pop(refresh_spec[0])
             # Generating the refreshed menu for each
             # spec's refresh above.
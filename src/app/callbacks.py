@@ -1,36 +1,73 @@
+import os
+
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+)
 from subprocess import (
     call,
 )
 
 from rumps import (
     Window,
+    alert,
     notification,
 )
 
 from src.parse import (
     RepositoryParser,
+    parse_repositories,
+    summarize,
 )
-from src.external.outlook import (
+from src.external import (
     outlook_manager,
+    jira_manager,
 )
 
 from src.conf.conf import (
     USER_DATA_DIR,
+    DATE_FORMAT,
+    WEEK_TO_DATE_SUMMARY,
+    CUSTOM_RANGE_SUMMARY,
+    SUMMARY_DAYS_MAP,
+    SUMMARY_LIMIT,
 )
 from src.conf.config import (
     config,
+    cache,
     data,
 )
 from src.utilities import (
     wait_for_result,
+    strfdelta,
 )
 from src.validators import (
     validate_directory,
     validate_repository,
     validate_repository_duplicate,
+    validate_date,
 )
 
 
+def notify_itinerary_generated(title, message, errors):
+    """Notify the user that an itinerary has been generated, including any ``errors``
+    that occurred while syncing the itinerary's events.
+    """
+    if errors:
+        notification(
+            title=title,
+            subtitle="Workday Report Incomplete",
+            message=f"{len(errors)} event(s) could not be synced. " + " ".join(errors),
+        )
+    else:
+        notification(
+            title=title,
+            subtitle="Workday Report Generated",
+            message=message,
+        )
+
+
 def click_add_repository_cb(sender):
     """Handle the use case where a user clicks on the ``Add Repository`` menu item available.
 
@@ -67,31 +104,70 @@ def click_add_repository_cb(sender):
 def click_parse_repositories_cb(sender, manual=True):
     """Handle the user case where a user clicks on the ``Parse Repositories`` menu item available.
     """
-    for repository in config.repositories:
-        result = RepositoryParser(repository).parse()
-        if manual:
-            notification(
-                title="Repository Parsed",
-                subtitle="Repository Parsed Successfully",
-                message=f"The repository: {repository} was successfully parsed.",
-            )
+    results = parse_repositories(
+        repositories=config.repositories,
+        workers=config.parse_workers,
+    )
+    if manual:
+        parsed = sum(results.values())
+        notification(
+            title="Repositories Parsed",
+            subtitle="Repositories Parsed Successfully",
+            message=f"{parsed} of {len(results)} repositories were successfully parsed.",
+        )
 
 
 def click_generate_report_cb(sender):
     """Handle the use case where a user clicks on the ``Generate Report`` menu item available.
     """
     if outlook_manager.authenticate():
-        outlook_manager.generate_itinerary(
-            itinerary=RepositoryParser(sender.repository).generate(),
+        errors = outlook_manager.generate_itinerary(
+            repository=sender.repository,
+            itinerary=RepositoryParser(sender.repository, enrich=jira_manager.enqueue).generate(),
             itinerary_type=config.itinerary_type,
         )
-        notification(
+        notify_itinerary_generated(
             title="Generate Report",
-            subtitle="Workday Report Generated",
             message="Workday report has been generated successfully.",
+            errors=errors,
         )
 
 
+def click_generate_past_report_cb(sender):
+    """Handle the use case where a user clicks on the ``Generate Past Report`` menu item available.
+
+    We'll present a prompt to the user, allowing them to enter the date of a previous day
+    to generate a report for, instead of the current day.
+    """
+    window = Window(
+        title="Generate Past Report",
+        message="Enter the date (YYYY-MM-DD) of the day to generate a report for.",
+        cancel=True,
+    )
+    result = wait_for_result(
+        window=window,
+        validators=[
+            validate_date,
+        ],
+    )
+
+    if result is not None:
+        day = datetime.strptime(result, DATE_FORMAT).date()
+
+        if outlook_manager.authenticate():
+            errors = outlook_manager.generate_itinerary(
+                repository=sender.repository,
+                itinerary=RepositoryParser(sender.repository, enrich=jira_manager.enqueue).generate(start=day),
+                itinerary_type=config.itinerary_type,
+                start=day,
+            )
+            notify_itinerary_generated(
+                title="Generate Past Report",
+                message=f"Workday report for {result} has been generated successfully.",
+                errors=errors,
+            )
+
+
 def click_stop_tracking_cb(sender):
     """Handle the user case where a user clicks on the ``Stop Tracking`` menu item available.
     """
@@ -108,6 +184,98 @@ def click_stop_tracking_cb(sender):
     )
 
 
+def summary_range(summary):
+    """Retrieve the (<start>, <end>) dates covered by a ``summary``, the end date is exclusive,
+    so the current day is always included in the summary.
+    """
+    today = date.today()
+
+    if summary == WEEK_TO_DATE_SUMMARY:
+        start = today - timedelta(days=today.weekday())
+    else:
+        start = today - timedelta(days=SUMMARY_DAYS_MAP[summary] - 1)
+
+    return start, today + timedelta(days=1)
+
+
+def show_summary(title, start, end):
+    """Summarize the time spent on each branch of every tracked repository from the ``start`` date
+    (inclusive) to the ``end`` date (exclusive), showing the branches worked on the most.
+    """
+    totals = summarize(
+        repositories=config.repositories,
+        start=start,
+        end=end,
+        workers=config.parse_workers,
+    )
+    ranked = sorted(totals.items(), key=lambda x: x[1], reverse=True)
+
+    lines = [
+        f"{os.path.basename(repository)} / {branch}: {strfdelta(duration)}"
+        for (repository, branch), duration in ranked[:SUMMARY_LIMIT]
+    ]
+    if len(ranked) > SUMMARY_LIMIT:
+        lines.append(
+            f"... and {len(ranked) - SUMMARY_LIMIT} more branches.",
+        )
+
+    alert(
+        title=f"{title} ({start.isoformat()} - {(end - timedelta(days=1)).isoformat()})",
+        message=(
+            "\n".join(lines) + f"\n\nTotal: {strfdelta(sum(totals.values(), timedelta()))}"
+            if lines else "Nothing was worked on."
+        ),
+    )
+
+
+def generate_summary_callback(summary):
+    """Generate a callback function to show the ``summary`` specified.
+    """
+    def callback(sender):
+        start, end = summary_range(summary)
+        show_summary(
+            title=summary,
+            start=start,
+            end=end,
+        )
+    return callback
+
+
+def click_custom_range_summary_cb(sender):
+    """Handle the use case where a user clicks on the ``Custom Range Summary`` menu item available.
+
+    We'll present a prompt to the user for the first and last dates to summarize.
+    """
+    dates = []
+
+    for which in ("first", "last"):
+        window = Window(
+            title=CUSTOM_RANGE_SUMMARY,
+            message=f"Enter the {which} date (YYYY-MM-DD) to summarize.",
+            cancel=True,
+        )
+        result = wait_for_result(
+            window=window,
+            validators=[
+                validate_date,
+            ],
+        )
+        if result is None:
+            return
+
+        dates.append(
+            datetime.strptime(result, DATE_FORMAT).date(),
+        )
+
+    start, last = sorted(dates)
+
+    show_summary(
+        title=CUSTOM_RANGE_SUMMARY,
+        start=start,
+        end=last + timedelta(days=1),
+    )
+
+
 def click_view_local_data_cb(sender):
     """Handle the use where where a user clicks on the ``View Local Data`` menu item available.
     """
@@ -121,7 +289,8 @@ def click_delete_local_data_cb(sender):
     """Handle the use case where a user clicks on the ``Reset Data`` menu item available.
     """
     config.update(**config.defaults)
-    data.update(**data.defaults)
+    cache.update(**cache.defaults)
+    data.clear()
     notification(
         title="Local Data Deleted",
         subtitle="Local Data Deleted Successfully",
@@ -0,0 +1,127 @@
+import logging
+import threading
+
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+)
+
+from src.parse import (
+    RepositoryParser,
+    parse_repositories,
+    compact_repositories,
+)
+from src.external import (
+    outlook_manager,
+    jira_manager,
+)
+from src.app.callbacks import (
+    notify_itinerary_generated,
+)
+
+from src.conf.conf import (
+    DURATION_MAP,
+    HOUR_MAP,
+)
+from src.conf.config import (
+    config,
+)
+
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) the scheduler wakes up to
+# check if any of its work is currently due.
+TICK = 30
+
+
+class Scheduler(threading.Thread):
+    def __init__(self):
+        """Initialize a new Scheduler, the scheduler runs in a background thread, parsing
+        all tracked repositories on the configured interval and syncing the current day's
+        itinerary with Outlook at the configured time, so none of this work blocks the menu.
+
+        Stored history outside of the configured retention window is compacted once a day.
+        """
+        super().__init__(daemon=True)
+
+        self.stopped = threading.Event()
+        self.parsed = None
+        self.compacted = None
+
+    def run(self):
+        """Run the scheduler until it's stopped, checking for any work due every ``TICK`` seconds.
+        """
+        while not self.stopped.wait(timeout=TICK):
+            try:
+                self.tick()
+            except Exception:
+                # The scheduler should never stop because of a single
+                # failure, the work will just be tried again later.
+                logger.exception("Scheduled work has failed.")
+
+    def stop(self):
+        """Stop the scheduler, any work currently being done is finished first.
+        """
+        self.stopped.set()
+
+    def tick(self):
+        """Handle any work that's currently due.
+        """
+        now = datetime.now()
+
+        if config.parse_interval in DURATION_MAP:
+            interval = timedelta(minutes=DURATION_MAP[config.parse_interval])
+
+            if self.parsed is None or now - self.parsed >= interval:
+                parse_repositories(
+                    repositories=config.repositories,
+                    workers=config.parse_workers,
+                )
+                self.parsed = now
+
+        if config.retention_weeks and self.compacted != date.today():
+            compact_repositories(
+                repositories=config.repositories,
+                weeks=config.retention_weeks,
+            )
+            self.compacted = date.today()
+
+        if config.outlook_sync_time in HOUR_MAP:
+            today = date.today().isoformat()
+
+            if now.hour >= HOUR_MAP[config.outlook_sync_time] and config.outlook_synced != today:
+                if self.sync():
+                    config.update(
+                        outlook_synced=today,
+                    )
+
+    @staticmethod
+    def sync():
+        """Sync the current day's itinerary for each tracked repository with Outlook.
+
+        Authentication requires input from the user, so nothing is synced if the Outlook
+        account isn't already authenticated, the sync is tried again on the next tick.
+        """
+        if not outlook_manager.authenticated:
+            return False
+
+        errors = []
+
+        for repository in config.repositories:
+            # Empty itineraries are still synced, so any events previously
+            # created for the day that no longer apply are deleted.
+            errors.extend(
+                outlook_manager.generate_itinerary(
+                    repository=repository,
+                    itinerary=RepositoryParser(repository, enrich=jira_manager.enqueue).generate(),
+                    itinerary_type=config.itinerary_type,
+                ),
+            )
+
+        notify_itinerary_generated(
+            title="Outlook Sync",
+            message="Today's workday reports have been synced with Outlook.",
+            errors=errors,
+        )
+        return True
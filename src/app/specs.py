@@ -2,7 +2,7 @@ from rumps import (
     separator,
 )
 
-from src.external.outlook import (
+from src.external import (
     outlook_manager,
 )
 
@@ -10,7 +10,12 @@ from src.conf.conf import (
     ADD_REPOSITORY,
     PARSE_REPOSITORIES,
     GENERATE_REPORT,
+    GENERATE_PAST_REPORT,
     STOP_TRACKING,
+    WEEK_TO_DATE_SUMMARY,
+    LAST_SEVEN_DAYS_SUMMARY,
+    LAST_THIRTY_DAYS_SUMMARY,
+    CUSTOM_RANGE_SUMMARY,
     VIEW_LOCAL_DATA,
     DELETE_LOCAL_DATA,
     ITINERARY_TYPE,
@@ -30,6 +35,8 @@ from src.conf.conf import (
     THREE_PM,
     FOUR_PM,
     FIVE_PM,
+    PARSE_INTERVAL,
+    OUTLOOK_SYNC_TIME,
     OUTLOOK_CALENDAR,
     DEBUG_MODE,
     ON,
@@ -44,13 +51,16 @@ from src.conf.conf import (
 )
 from src.conf.config import (
     config,
+    cache,
 )
 
 from src.app.callbacks import (
     click_add_repository_cb,
     click_parse_repositories_cb,
     click_generate_report_cb,
+    click_generate_past_report_cb,
     click_stop_tracking_cb,
+    click_custom_range_summary_cb,
     click_view_local_data_cb,
     click_delete_local_data_cb,
     click_grant_authentication_cb,
@@ -58,6 +68,7 @@ from src.app.callbacks import (
     click_configure_jira_username_cb,
     click_configure_jira_token_cb,
     generate_config_callback,
+    generate_summary_callback,
 )
 
 
@@ -119,12 +130,33 @@ def generate_options_spec():
             ],
         },
         separator,
+        {
+            "menu": PARSE_INTERVAL,
+            "config": "parse_interval",
+            "choices": [
+                (NONE, generate_config_callback(parse_interval=NONE)),
+                (FIVE_MINUTES, generate_config_callback(parse_interval=FIVE_MINUTES)),
+                (FIFTEEN_MINUTES, generate_config_callback(parse_interval=FIFTEEN_MINUTES)),
+                (THIRTY_MINUTES, generate_config_callback(parse_interval=THIRTY_MINUTES)),
+            ],
+        },
+        {
+            "menu": OUTLOOK_SYNC_TIME,
+            "config": "outlook_sync_time",
+            "choices": [
+                (NONE, generate_config_callback(outlook_sync_time=NONE)),
+                (THREE_PM, generate_config_callback(outlook_sync_time=THREE_PM)),
+                (FOUR_PM, generate_config_callback(outlook_sync_time=FOUR_PM)),
+                (FIVE_PM, generate_config_callback(outlook_sync_time=FIVE_PM)),
+            ],
+        },
+        separator,
         {
             "menu": OUTLOOK_CALENDAR,
             "config": "outlook_calendar",
             "choices": [
                 (choice, generate_config_callback(outlook_calendar=choice))
-                for choice in outlook_manager.calendar_choices
+                for choice in (outlook_manager.calendar_choices if outlook_manager.loaded else cache.calendars)
             ],
         },
         separator,
@@ -200,6 +232,11 @@ def generate_repos_spec():
                         "callback": click_generate_report_cb,
                         "append": "repository",
                     },
+                    {
+                        "menu": GENERATE_PAST_REPORT,
+                        "callback": click_generate_past_report_cb,
+                        "append": "repository",
+                    },
                     {
                         "menu": STOP_TRACKING,
                         "callback": click_stop_tracking_cb,
@@ -223,6 +260,22 @@ def generate_tools_spec():
     ]
     """
     return [
+        {
+            "menu": WEEK_TO_DATE_SUMMARY,
+            "callback": generate_summary_callback(WEEK_TO_DATE_SUMMARY),
+        },
+        {
+            "menu": LAST_SEVEN_DAYS_SUMMARY,
+            "callback": generate_summary_callback(LAST_SEVEN_DAYS_SUMMARY),
+        },
+        {
+            "menu": LAST_THIRTY_DAYS_SUMMARY,
+            "callback": generate_summary_callback(LAST_THIRTY_DAYS_SUMMARY),
+        },
+        {
+            "menu": CUSTOM_RANGE_SUMMARY,
+            "callback": click_custom_range_summary_cb,
+        },
         {
             "menu": VIEW_LOCAL_DATA,
             "callback": click_view_local_data_cb,
@@ -245,14 +298,21 @@ def generate_outlook_spec():
         },
     ]
     """
+    # Until the Outlook manager has been loaded in the background, the
+    # stored token is used to determine the authentication state.
+    if outlook_manager.loaded:
+        authenticated = outlook_manager.authenticated
+    else:
+        authenticated = config.outlook_token is not None
+
     return [
         {
             "menu": GRANT_AUTHENTICATION,
-            "callback": click_grant_authentication_cb if not outlook_manager.authenticated else None,
+            "callback": click_grant_authentication_cb if not authenticated else None,
         },
         {
             "menu": REVOKE_AUTHENTICATION,
-            "callback": generate_config_callback(outlook_token=None) if outlook_manager.authenticated else None,
+            "callback": generate_config_callback(outlook_token=None) if authenticated else None,
         },
     ]
 
@@ -0,0 +1,344 @@
+import sys
+import json
+import argparse
+
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+)
+
+from requests import (
+    RequestException,
+)
+
+from src.parse import (
+    RepositoryParser,
+    parse_repositories,
+    compact_repositories,
+    summarize,
+)
+from src.external import (
+    outlook_manager,
+    jira_manager,
+)
+
+from src.conf.conf import (
+    APP_NAME,
+    DATE_FORMAT,
+    MULTIPLE_EVENTS,
+    SINGLE_EVENT,
+)
+from src.conf.config import (
+    config,
+    data,
+)
+
+# Exit codes used by the command line interface, usage errors
+# exit with "2", as is done by argparse itself.
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_UNAUTHENTICATED = 3
+
+
+def _date(value):
+    """Convert a "%Y-%m-%d" ``value`` into a date, used as an argument type.
+    """
+    try:
+        return datetime.strptime(value, DATE_FORMAT).date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"\"{value}\" is not a valid date (YYYY-MM-DD)."
+        )
+
+
+def _weeks(value):
+    """Convert a ``value`` into a number of weeks, used as an argument type.
+    """
+    try:
+        weeks = int(value)
+    except ValueError:
+        weeks = -1
+
+    if weeks < 0:
+        raise argparse.ArgumentTypeError(
+            f"\"{value}\" is not a valid number of weeks (0 or more)."
+        )
+    return weeks
+
+
+def _days(start, end):
+    """Yield every date from the ``start`` date (inclusive) to the ``end`` date (exclusive).
+    """
+    while start < end:
+        yield start
+        start += timedelta(days=1)
+
+
+def _range(args):
+    """Retrieve the (<start>, <end>) dates from the ``args`` specified, the end date
+    entered is inclusive, the end date returned is exclusive.
+    """
+    start = args.start or date.today()
+    end = args.end or start
+
+    return start, end + timedelta(days=1)
+
+
+def emit(**kwargs):
+    """Write a single json line to stdout.
+    """
+    sys.stdout.write(json.dumps(kwargs, default=str) + "\n")
+    sys.stdout.flush()
+
+
+def _parse(args):
+    """Parse each repository, emitting any repositories that could not be parsed,
+    the repositories that were parsed successfully are returned.
+    """
+    results = parse_repositories(
+        repositories=args.repositories,
+        workers=args.workers,
+    )
+    for repository, parsed in results.items():
+        if not parsed:
+            emit(
+                repository=repository,
+                parsed=parsed,
+            )
+    return [repository for repository, parsed in results.items() if parsed]
+
+
+def parse_cmd(args):
+    """Parse each repository, emitting whether or not each repository was parsed successfully.
+    """
+    results = parse_repositories(
+        repositories=args.repositories,
+        workers=args.workers,
+    )
+    for repository, parsed in results.items():
+        emit(
+            repository=repository,
+            parsed=parsed,
+        )
+    return EXIT_OK if all(results.values()) else EXIT_FAILED
+
+
+def generate_cmd(args):
+    """Generate the events for each repository, events are emitted as they're generated,
+    or the time spent on each branch is emitted when summarizing.
+    """
+    start, end = _range(args)
+    repositories = _parse(args)
+    code = EXIT_OK if len(repositories) == len(args.repositories) else EXIT_FAILED
+
+    if args.summary:
+        totals = summarize(
+            repositories=repositories,
+            start=start,
+            end=end,
+            workers=args.workers,
+            parse=False,
+        )
+        for (repository, branch), duration in totals.items():
+            emit(
+                repository=repository,
+                branch=branch,
+                duration=duration.total_seconds(),
+            )
+        return code
+
+    for repository in repositories:
+        for event in RepositoryParser(repository).stream(start=start, end=end, parse=False):
+            emit(
+                repository=repository,
+                branch=event["branch"],
+                issue=event["issue"],
+                start=event["start"].isoformat(),
+                end=event["end"].isoformat(),
+                duration=event["duration"].total_seconds(),
+            )
+    return code
+
+
+def sync_cmd(args):
+    """Sync the itinerary of each day for each repository with Outlook, emitting the errors
+    for each itinerary synced, or the changes that would be made when planning.
+
+    Authentication requires a browser, so the Outlook account must already be authenticated
+    through the app, nothing is synced otherwise.
+    """
+    if not outlook_manager.authenticated:
+        emit(
+            error="The Outlook account is not authenticated, authenticate through the app first.",
+        )
+        return EXIT_UNAUTHENTICATED
+
+    start, end = _range(args)
+    repositories = _parse(args)
+    failed = len(repositories) != len(args.repositories)
+
+    for repository in repositories:
+        for day in _days(start, end):
+            itinerary = list(
+                RepositoryParser(repository, enrich=jira_manager.enqueue).stream(start=day, parse=False),
+            )
+
+            if args.plan:
+                try:
+                    plan = outlook_manager.plan_itinerary(
+                        repository=repository,
+                        itinerary=itinerary,
+                        itinerary_type=args.itinerary_type,
+                        start=day,
+                    )
+                except RequestException as exc:
+                    failed = True
+                    emit(
+                        repository=repository,
+                        date=day.isoformat(),
+                        error=f"The existing itinerary events could not be retrieved: {exc}",
+                    )
+                    continue
+
+                for change in plan:
+                    emit(
+                        repository=repository,
+                        date=day.isoformat(),
+                        action=change["action"],
+                        subject=change["subject"],
+                    )
+                continue
+
+            errors = outlook_manager.generate_itinerary(
+                repository=repository,
+                itinerary=itinerary,
+                itinerary_type=args.itinerary_type,
+                start=day,
+            )
+            failed = failed or bool(errors)
+
+            emit(
+                repository=repository,
+                date=day.isoformat(),
+                events=len(itinerary),
+                errors=errors,
+            )
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def compact_cmd(args):
+    """Compact the stored history of each repository, emitting whether or not anything was compacted.
+
+    When pruning, everything stored for any other repository is deleted before compacting.
+    """
+    if args.prune:
+        data.prune(
+            repositories=args.repositories,
+        )
+
+    results = compact_repositories(
+        repositories=args.repositories,
+        weeks=args.weeks,
+    )
+    for repository, compacted in results.items():
+        emit(
+            repository=repository,
+            compacted=compacted,
+        )
+    return EXIT_OK
+
+
+def build_parser():
+    """Build the argument parser used by the command line interface.
+    """
+    parser = argparse.ArgumentParser(
+        prog=APP_NAME.lower(),
+        description=(
+            "Parse tracked repositories and generate or sync their reports without the menu bar app, "
+            "output is written as json lines."
+        ),
+    )
+    commands = parser.add_subparsers(
+        dest="command",
+        required=True,
+    )
+
+    parse = commands.add_parser("parse", help="Parse repositories.")
+    generate = commands.add_parser("generate", help="Generate the events of repositories.")
+    sync = commands.add_parser("sync", help="Sync the itineraries of repositories with Outlook.")
+    compact = commands.add_parser("compact", help="Compact the stored history of repositories.")
+
+    for command in (parse, generate, sync, compact):
+        command.add_argument(
+            "repositories",
+            nargs="*",
+            help="The repositories to use, all tracked repositories are used by default.",
+        )
+        command.add_argument(
+            "--workers",
+            type=int,
+            default=config.parse_workers,
+            help="The number of repositories parsed at the same time.",
+        )
+
+    for command in (generate, sync):
+        command.add_argument(
+            "--start",
+            type=_date,
+            help="The first date (YYYY-MM-DD) to use, the current day is used by default.",
+        )
+        command.add_argument(
+            "--end",
+            type=_date,
+            help="The last date (YYYY-MM-DD) to use, only the start date is used by default.",
+        )
+
+    generate.add_argument(
+        "--summary",
+        action="store_true",
+        help="Emit the time spent on each branch instead of each event.",
+    )
+    sync.add_argument(
+        "--plan",
+        action="store_true",
+        help="Emit the changes that would be made without changing anything.",
+    )
+    sync.add_argument(
+        "--itinerary-type",
+        choices=(MULTIPLE_EVENTS, SINGLE_EVENT),
+        default=config.itinerary_type,
+        help="The type of itinerary synced, the configured itinerary type is used by default.",
+    )
+
+    compact.add_argument(
+        "--weeks",
+        type=_weeks,
+        default=config.retention_weeks,
+        help="The number of weeks of history kept (0 keeps everything), the configured retention is used by default.",
+    )
+    compact.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete everything stored for any repository other than the repositories being compacted.",
+    )
+
+    parse.set_defaults(func=parse_cmd)
+    generate.set_defaults(func=generate_cmd)
+    sync.set_defaults(func=sync_cmd)
+    compact.set_defaults(func=compact_cmd)
+
+    return parser
+
+
+def main(argv=None):
+    """Run the command line interface, returning the exit code.
+    """
+    args = build_parser().parse_args(argv)
+    args.repositories = args.repositories or config.repositories
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -35,6 +35,20 @@ USER_DATA_FILE = "%(user_data_dir)s%(sep)s%(data_file)s" % {
     "sep": os.sep,
     "data_file": "data.json",
 }
+# The cache file used to store snapshots of any remote data (calendars, etc.)
+# so it's available without waiting on the network.
+USER_CACHE_FILE = "%(user_data_dir)s%(sep)s%(cache_file)s" % {
+    "user_data_dir": USER_DATA_DIR,
+    "sep": os.sep,
+    "cache_file": "cache.json",
+}
+# The database used to store all parsed reflog data, any data previously
+# stored in the data file above is migrated into the database once.
+USER_DATABASE_FILE = "%(user_data_dir)s%(sep)s%(database_file)s" % {
+    "user_data_dir": USER_DATA_DIR,
+    "sep": os.sep,
+    "database_file": "data.sqlite3",
+}
 
 # Some of the constants that we use to represent configurations or settings
 # that are persisted through the app can be stored here and used throughout.
@@ -43,9 +57,14 @@ ADD_REPOSITORY = "Add Repository"
 PARSE_REPOSITORIES = "Parse Repositories"
 
 GENERATE_REPORT = "Generate Report"
+GENERATE_PAST_REPORT = "Generate Past Report"
 STOP_TRACKING = "Stop Tracking"
 
 TOOLS = "Tools"
+WEEK_TO_DATE_SUMMARY = "Week To Date Summary"
+LAST_SEVEN_DAYS_SUMMARY = "Last 7 Days Summary"
+LAST_THIRTY_DAYS_SUMMARY = "Last 30 Days Summary"
+CUSTOM_RANGE_SUMMARY = "Custom Range Summary"
 VIEW_LOCAL_DATA = "View Local Data"
 DELETE_LOCAL_DATA = "Delete Local Data"
 
@@ -67,6 +86,8 @@ HARDCODED_END_TIME = "Hardcoded End Time"
 THREE_PM = "3:00 PM"
 FOUR_PM = "4:00 PM"
 FIVE_PM = "5:00 PM"
+PARSE_INTERVAL = "Parse Interval"
+OUTLOOK_SYNC_TIME = "Outlook Sync Time"
 OUTLOOK_CALENDAR = "Outlook Calendar"
 DEFAULT_CALENDAR = "Default Calendar"
 DEBUG_MODE = "Debug Mode"
@@ -86,6 +107,18 @@ CONFIGURE_JIRA_TOKEN = "Configure Jira Token"
 
 ABOUT = "About"
 
+# Format used when a date is entered manually by a user.
+DATE_FORMAT = "%Y-%m-%d"
+# Format of the timestamps present in each reflog selector when the
+# reflog is retrieved with the "--date=iso" option.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+# Pattern used to recognize the jira issue key within a branch name, the key
+# can appear anywhere in the branch ("feature/WD-123-add-report" -> "WD-123").
+ISSUE_PATTERN = r"[A-Z][A-Z0-9]+-\d+"
+# The time the last itinerary entry of a day that has already passed ends at when no
+# hardcoded end time is configured, there's no way to know when work actually stopped.
+WORKDAY_END_TIME = FIVE_PM
+
 # Any additional constants or maps can be placed here that make
 # use of or transform the constants above.
 DURATION_MAP = {
@@ -94,6 +127,11 @@ DURATION_MAP = {
     FIFTEEN_MINUTES: 15,
     THIRTY_MINUTES: 30,
 }
+# The number of days (including the current day) each "last N days" summary covers.
+SUMMARY_DAYS_MAP = {
+    LAST_SEVEN_DAYS_SUMMARY: 7,
+    LAST_THIRTY_DAYS_SUMMARY: 30,
+}
 HOUR_MAP = {
     "6:00 AM": 6,
     "7:00 AM": 7,
@@ -102,3 +140,6 @@ HOUR_MAP = {
     "4:00 PM": 16,
     "5:00 PM": 17,
 }
+# The maximum number of branches listed in a summary, branches
+# are listed from the most time spent to the least.
+SUMMARY_LIMIT = 20
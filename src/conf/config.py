@@ -1,40 +1,181 @@
+import os
+import copy
+import json
+import atexit
+import tempfile
+import threading
+
+from contextlib import (
+    contextmanager,
+)
+
 from simple_config import (
     Config,
 )
 
 from src.conf.conf import (
+    USER_DATA_DIR,
     USER_CONFIG_FILE,
     USER_DATA_FILE,
+    USER_DATABASE_FILE,
+    USER_CACHE_FILE,
     MULTIPLE_EVENTS,
     FIVE_MINUTES,
+    NONE,
     DEFAULT_CALENDAR,
     OFF,
+    ISSUE_PATTERN,
+)
+from src.conf.store import (
+    DataStore,
 )
 
+# How long (in seconds) after the last update that the configuration is written,
+# every update made in the meantime is written with a single write.
+FLUSH_DELAY = 0.5
+
 
 class ExtConfig(Config):
+    def __init__(self, path, defaults=None):
+        """Initialize a new ExtConfig, allowing listeners to be notified of any updates.
+
+        Updates are applied in memory right away, but writes to the file are coalesced, a burst
+        of updates (or every update within a ``batch``) is written once, ``FLUSH_DELAY`` seconds
+        after the last update, and any pending updates are written before exiting.
+        """
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.dirty = False
+        self.timer = None
+        self.path = path
+        self.defaults = defaults or {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r") as buff:
+                self.config = json.loads(buff.read())
+        else:
+            self.config = copy.deepcopy(self.defaults)
+            self.dirty = True
+            self.flush()
+
+        atexit.register(self.flush)
+
+    def listen(self, listener):
+        """Add a ``listener`` that's called with the keys updated whenever the configuration is updated.
+        """
+        self.listeners.append(
+            listener,
+        )
+
+    def update(self, **kwargs):
+        """Update the specified configuration, notifying any listeners of the keys updated.
+
+        The configuration is written to the file once any updates stop coming in, or once
+        the outermost ``batch`` is finished when updating within a batch.
+        """
+        with self.lock:
+            self.config.update(**kwargs)
+            self.dirty = True
+
+            if not self.depth:
+                self._schedule_flush()
+
+        for listener in self.listeners:
+            listener(kwargs.keys())
+
+        return self.config
+
+    @contextmanager
+    def batch(self):
+        """Group every update made within the context into a single write, batches can be
+        nested, the configuration is written once the outermost batch is finished.
+        """
+        with self.lock:
+            self.depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.depth -= 1
+                flush = not self.depth
+            if flush:
+                self.flush()
+
+    def _schedule_flush(self):
+        """Schedule the configuration to be written ``FLUSH_DELAY`` seconds from now, any flush
+        already scheduled is pushed back, so a burst of updates is only written once.
+        """
+        if self.timer:
+            self.timer.cancel()
+
+        self.timer = threading.Timer(
+            interval=FLUSH_DELAY,
+            function=self.flush,
+        )
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        """Write the configuration to the file if it's been updated since it was last written.
+
+        The configuration is written to a temporary file that then replaces the file, so
+        the file is never left partially written, even if writing is interrupted.
+        """
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+
+            if not self.dirty:
+                return
+
+            # Every write uses its own temporary file, so processes writing the
+            # same file at once (the app and the cli) never clobber each other.
+            descriptor, temp = tempfile.mkstemp(
+                dir=os.path.dirname(self.path),
+                prefix=os.path.basename(self.path),
+                suffix=".tmp",
+            )
+            try:
+                with os.fdopen(descriptor, "w") as buff:
+                    buff.write(json.dumps(self.config, sort_keys=True, indent=4))
+                    buff.flush()
+                    os.fsync(buff.fileno())
+
+                os.replace(temp, self.path)
+            except BaseException:
+                os.remove(temp)
+                raise
+            self.dirty = False
+
     def sync(self):
         """Sync up the specified configuration, ensuring any missing ``defaults`` are available and set
-        on the instance.
+        on the instance, everything is written to the file at once.
         """
-        for default, value in self.defaults.items():
-            if default not in self.config:
-                self.update(**{
-                    default: value,
-                })
+        with self.batch():
+            for default, value in self.defaults.items():
+                if default not in self.config:
+                    self.update(**{
+                        default: value,
+                    })
+
+            remove = []
 
-        remove = []
+            for existing, value in self.config.items():
+                if existing not in self.defaults:
+                    remove.append(
+                        existing,
+                    )
+            if remove:
+                for rem in remove:
+                    self.config.pop(rem)
+                self.update()
 
-        for existing, value in self.config.items():
-            if existing not in self.defaults:
-                remove.append(
-                    existing,
-                )
-        if remove:
-            for rem in remove:
-                self.config.pop(rem)
-            self.update()
 
+# Every file below is kept within the user data directory, which
+# doesn't exist yet when running on a fresh machine.
+os.makedirs(USER_DATA_DIR, exist_ok=True)
 
 config = ExtConfig(
     path=USER_CONFIG_FILE,
@@ -51,15 +192,34 @@ config = ExtConfig(
         "hardcoded_start_time": None,
         "hardcoded_end_time": None,
         "debug_mode": OFF,
+        "parse_workers": 4,
+        "parse_interval": NONE,
+        "outlook_sync_time": NONE,
+        "outlook_synced": None,
+        # How long (in seconds) issues retrieved from jira are cached, issues
+        # that don't exist are cached for a shorter amount of time.
+        "jira_issue_ttl": 60 * 60 * 24,
+        "jira_missing_issue_ttl": 60 * 60,
+        "issue_pattern": ISSUE_PATTERN,
+        # How many weeks of refs are kept for each repository, older days are
+        # compacted into daily totals for each branch (0 keeps everything).
+        "retention_weeks": 12,
     },
 )
 
-data = ExtConfig(
-    path=USER_DATA_FILE,
+cache = ExtConfig(
+    path=USER_CACHE_FILE,
     defaults={
-        "tracked": {},
+        "calendars": {},
+        "calendars_updated": None,
+        "issues": {},
     },
 )
 
+data = DataStore(
+    path=USER_DATABASE_FILE,
+)
+
 config.sync()
-data.sync()
+cache.sync()
+data.migrate(USER_DATA_FILE)
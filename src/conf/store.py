@@ -0,0 +1,419 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+
+from contextlib import (
+    contextmanager,
+)
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+    timezone,
+)
+from functools import (
+    lru_cache,
+)
+from typing import (
+    NamedTuple,
+)
+
+from src.conf.conf import (
+    TIMESTAMP_FORMAT,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repositories (
+    repository TEXT PRIMARY KEY,
+    cursor TEXT,
+    offsets TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS refs (
+    repository TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    "commit" TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    message TEXT NOT NULL,
+    previous TEXT NOT NULL,
+    current TEXT NOT NULL,
+    PRIMARY KEY (repository, hash)
+);
+CREATE INDEX IF NOT EXISTS refs_repository_timestamp ON refs (repository, timestamp);
+"""
+# The current version of the database, stored in the "user_version" pragma
+# of the database and used to determine which upgrades need to be applied.
+VERSION = 3
+
+
+# The ordinal of the unix epoch's date, used to convert dates into the
+# day numbers (days since the unix epoch) refs are grouped by.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=None)
+def offset_timezone(offset):
+    """Retrieve the timezone for a utc ``offset`` in seconds, timezones are cached
+    since the same handful of offsets are used by every ref.
+    """
+    return timezone(timedelta(seconds=offset))
+
+
+def day_number(day):
+    """Retrieve the day number (days since the unix epoch) of a ``day``.
+    """
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+class Ref(NamedTuple):
+    """A single parsed reflog "checkout" entry.
+
+    Timestamps are kept as integers (the epoch and utc offset in seconds) and branch names
+    are interned, so the thousands of refs moving between the same handful of branches
+    share their strings, everything else is derived when it's needed.
+    """
+    commit: str
+    epoch: int
+    offset: int
+    previous: str
+    current: str
+
+    @property
+    def day(self):
+        """Return the day number (days since the unix epoch) of the local day the ref was made on.
+        """
+        return (self.epoch + self.offset) // 86400
+
+    @property
+    def timestamp(self):
+        """Return the "%Y-%m-%d %H:%M:%S %z" timestamp of the ref.
+        """
+        return datetime.fromtimestamp(self.epoch, tz=offset_timezone(self.offset)).strftime(TIMESTAMP_FORMAT)
+
+
+def _epoch(timestamp):
+    """Retrieve the epoch and utc offset (in seconds) of a "%Y-%m-%d %H:%M:%S %z" ``timestamp``.
+    """
+    timestamp = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+    return (
+        int(timestamp.timestamp()),
+        int(timestamp.utcoffset().total_seconds()),
+    )
+
+
+class DataStore:
+    def __init__(self, path):
+        """Initialize a new DataStore, the store keeps all parsed reflog data for every
+        tracked repository in a SQLite database, one row per ref, so refs can be inserted
+        incrementally and queried by date without loading unrelated history.
+        """
+        self.path = path
+        self.local = threading.local()
+
+        # Write-ahead logging lets the connections from other
+        # threads read while another thread is writing.
+        self.connection.execute("PRAGMA journal_mode = WAL")
+
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+        self.upgrade()
+
+    @property
+    def connection(self):
+        """Retrieve the connection used by the current thread, SQLite connections can't
+        be shared between threads, so each thread uses its own connection to the database.
+        """
+        if not hasattr(self.local, "connection"):
+            self.local.connection = sqlite3.connect(self.path, timeout=30)
+            self.local.connection.row_factory = sqlite3.Row
+            self.local.depth = 0
+
+        return self.local.connection
+
+    def upgrade(self):
+        """Upgrade the database to the current ``VERSION``, applying each upgrade
+        required in order, databases already up to date are left alone.
+        """
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < 1:
+            # Version 1: The epoch and utc offset (in seconds) of each ref is
+            # stored so timestamps don't need to be parsed when generating reports.
+            with self.connection:
+                self.connection.execute("ALTER TABLE refs ADD COLUMN epoch INTEGER NOT NULL DEFAULT 0")
+                self.connection.execute("ALTER TABLE refs ADD COLUMN offset INTEGER NOT NULL DEFAULT 0")
+
+                for row in self.connection.execute("SELECT rowid, timestamp FROM refs").fetchall():
+                    self.connection.execute(
+                        "UPDATE refs SET epoch = ?, offset = ? WHERE rowid = ?",
+                        (*_epoch(row["timestamp"]), row["rowid"]),
+                    )
+
+        if version < 2:
+            # Version 2: Raw reflog entries are no longer stored once they've been parsed, and
+            # days older than the retention window are rolled up into daily totals per branch.
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE refs_parsed ("
+                    "repository TEXT NOT NULL, hash TEXT NOT NULL, \"commit\" TEXT NOT NULL, "
+                    "timestamp TEXT NOT NULL, epoch INTEGER NOT NULL, offset INTEGER NOT NULL, "
+                    "message TEXT NOT NULL, previous TEXT NOT NULL, current TEXT NOT NULL, "
+                    "PRIMARY KEY (repository, hash))"
+                )
+                self.connection.execute(
+                    "INSERT INTO refs_parsed SELECT "
+                    "repository, hash, \"commit\", timestamp, epoch, offset, message, previous, current FROM refs"
+                )
+                self.connection.execute("DROP TABLE refs")
+                self.connection.execute("ALTER TABLE refs_parsed RENAME TO refs")
+                self.connection.execute(
+                    "CREATE INDEX refs_repository_timestamp ON refs (repository, timestamp)"
+                )
+                self.connection.execute(
+                    "CREATE TABLE totals ("
+                    "repository TEXT NOT NULL, day TEXT NOT NULL, branch TEXT NOT NULL, "
+                    "duration INTEGER NOT NULL, PRIMARY KEY (repository, day, branch))"
+                )
+            # Pages freed by pruning are released back to the file system, the mode only
+            # takes effect once the database is vacuumed, which is done once here.
+            self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.connection.execute("VACUUM")
+
+        if version < 3:
+            # Version 3: Only the columns that are read are stored, the message (derived from the
+            # branches) is no longer stored, and hashes are stored as their raw 16 byte digest.
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE refs_compact ("
+                    "repository TEXT NOT NULL, hash BLOB NOT NULL, \"commit\" TEXT NOT NULL, "
+                    "timestamp TEXT NOT NULL, epoch INTEGER NOT NULL, offset INTEGER NOT NULL, "
+                    "previous TEXT NOT NULL, current TEXT NOT NULL, "
+                    "PRIMARY KEY (repository, hash))"
+                )
+                self.connection.executemany(
+                    "INSERT INTO refs_compact VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (row[0], bytes.fromhex(row[1]), *row[2:]) for row in self.connection.execute(
+                            "SELECT repository, hash, \"commit\", timestamp, epoch, offset, previous, current FROM refs"
+                        ).fetchall()
+                    ),
+                )
+                self.connection.execute("DROP TABLE refs")
+                self.connection.execute("ALTER TABLE refs_compact RENAME TO refs")
+                self.connection.execute(
+                    "CREATE INDEX refs_repository_timestamp ON refs (repository, timestamp)"
+                )
+            self.vacuum()
+
+        self.connection.execute("PRAGMA user_version = %(version)d" % {
+            "version": VERSION,
+        })
+
+    @contextmanager
+    def transaction(self):
+        """Group every write made within the context into a single transaction, transactions
+        can be nested, the outermost transaction is the only one that commits.
+        """
+        connection = self.connection
+
+        self.local.depth += 1
+        try:
+            yield
+        except Exception:
+            if self.local.depth == 1:
+                connection.rollback()
+            raise
+        else:
+            if self.local.depth == 1:
+                connection.commit()
+        finally:
+            self.local.depth -= 1
+
+    def migrate(self, path):
+        """Migrate the tracked data from a legacy json data file at the ``path`` specified.
+
+        The legacy data file is renamed once migrated, so this is only ever done once.
+        """
+        if not os.path.exists(path):
+            return
+
+        with open(path, "r") as buff:
+            tracked = json.loads(buff.read()).get("tracked", {})
+
+        with self.transaction():
+            for repository, values in tracked.items():
+                self.insert(
+                    repository=repository,
+                    refs=(
+                        (
+                            bytes.fromhex(_hash),
+                            Ref(
+                                parsed["commit"],
+                                *_epoch(parsed["timestamp"]),
+                                sys.intern(parsed["previous"]),
+                                sys.intern(parsed["current"]),
+                            ),
+                        ) for _hash, parsed in values["parsed"].items() if _hash in values["hashes"]
+                    ),
+                )
+                self.update(
+                    repository=repository,
+                    cursor=values.get("cursor"),
+                    offsets=values.get("offsets", {}),
+                )
+
+        os.replace(path, "%(path)s.migrated" % {
+            "path": path,
+        })
+
+    def repository(self, repository):
+        """Retrieve the tracked information (cursor and offsets) for a repository,
+        ``None`` is returned if the repository has never been parsed.
+        """
+        row = self.connection.execute(
+            "SELECT cursor, offsets FROM repositories WHERE repository = ?",
+            (repository,),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "cursor": row["cursor"],
+            "offsets": json.loads(row["offsets"]),
+        }
+
+    def abbrev(self, repository):
+        """Retrieve the length commits are abbreviated to in the refs stored for a repository,
+        ``None`` is returned if no refs are stored yet.
+        """
+        row = self.connection.execute(
+            "SELECT length(\"commit\") FROM refs WHERE repository = ? LIMIT 1",
+            (repository,),
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def update(self, repository, cursor, offsets):
+        """Update the tracked information (cursor and offsets) for a repository.
+        """
+        with self.transaction():
+            self.connection.execute(
+                "INSERT OR REPLACE INTO repositories (repository, cursor, offsets) VALUES (?, ?, ?)",
+                (repository, cursor, json.dumps(offsets)),
+            )
+
+    def insert(self, repository, refs):
+        """Insert the ``refs`` specified for a repository, refs should be an iterable of
+        (<md5_digest>, <ref>) tuples, refs already stored are ignored.
+        """
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO refs "
+                "(repository, hash, \"commit\", timestamp, epoch, offset, previous, current) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        repository,
+                        _hash,
+                        ref.commit,
+                        ref.timestamp,
+                        ref.epoch,
+                        ref.offset,
+                        ref.previous,
+                        ref.current,
+                    ) for _hash, ref in refs
+                ),
+            )
+
+    def refs(self, repository, start, end):
+        """Retrieve the refs for a repository with a timestamp between ``start`` (inclusive)
+        and ``end`` (exclusive), ordered by day and then by their epoch.
+
+        Timestamps are stored as "%Y-%m-%d %H:%M:%S %z" strings, so dates ("%Y-%m-%d")
+        can be used to retrieve the refs from whole days using the index available.
+
+        Only the columns a ``Ref`` is made up of are read, each row is turned straight
+        into a ``Ref`` as it's read from the database, nothing else is copied.
+        """
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            "SELECT \"commit\", epoch, offset, previous, current FROM refs "
+            "WHERE repository = ? AND timestamp >= ? AND timestamp < ? "
+            "ORDER BY substr(timestamp, 1, 10), epoch",
+            (repository, start, end),
+        )
+
+        for commit, epoch, offset, previous, current in cursor:
+            yield Ref(commit, epoch, offset, sys.intern(previous), sys.intern(current))
+
+    def oldest(self, repository):
+        """Retrieve the date ("%Y-%m-%d") of the oldest ref stored for a repository,
+        ``None`` is returned if no refs are stored.
+        """
+        row = self.connection.execute(
+            "SELECT min(substr(timestamp, 1, 10)) FROM refs WHERE repository = ?",
+            (repository,),
+        ).fetchone()
+
+        return row[0]
+
+    def totals(self, repository, start, end):
+        """Retrieve the daily totals (in seconds) for each branch of a repository, for the
+        days between ``start`` (inclusive) and ``end`` (exclusive) that have been compacted.
+        """
+        yield from self.connection.execute(
+            "SELECT day, branch, duration FROM totals "
+            "WHERE repository = ? AND day >= ? AND day < ? ORDER BY day",
+            (repository, start, end),
+        )
+
+    def compact(self, repository, before, totals):
+        """Compact the refs of a repository from every day before the ``before`` date, the daily ``totals``
+        ({(<day>, <branch>): <seconds>}) generated from those refs are stored, and the refs are pruned.
+        """
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT INTO totals (repository, day, branch, duration) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (repository, day, branch) DO UPDATE SET duration = duration + excluded.duration",
+                (
+                    (repository, day, branch, duration) for (day, branch), duration in totals.items()
+                ),
+            )
+            self.connection.execute(
+                "DELETE FROM refs WHERE repository = ? AND timestamp < ?",
+                (repository, before),
+            )
+
+    def prune(self, repositories):
+        """Prune all data stored for any repositories that aren't in the ``repositories`` specified.
+        """
+        with self.transaction():
+            for table in ("refs", "totals", "repositories"):
+                self.connection.execute(
+                    "DELETE FROM %(table)s WHERE repository NOT IN (SELECT value FROM json_each(?))" % {
+                        "table": table,
+                    },
+                    (json.dumps(list(repositories)),),
+                )
+
+    def vacuum(self):
+        """Release any pages freed by pruning data back to the file system.
+
+        The pragma frees a single page each time it's stepped, so it's run as a script
+        to step it until every free page is released, anything pending is committed first.
+        """
+        self.connection.executescript("PRAGMA incremental_vacuum;")
+
+    def clear(self):
+        """Clear all tracked data from the store.
+        """
+        with self.transaction():
+            self.connection.execute("DELETE FROM refs")
+            self.connection.execute("DELETE FROM totals")
+            self.connection.execute("DELETE FROM repositories")
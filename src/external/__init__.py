@@ -0,0 +1,14 @@
+from src.utilities import (
+    LazyObject,
+)
+
+# The external managers pull in the O365 and atlassian stacks (requests, oauthlib, bs4, etc.)
+# and construct their clients when imported, so they're only loaded when first used.
+outlook_manager = LazyObject(
+    module="src.external.outlook",
+    name="outlook_manager",
+)
+jira_manager = LazyObject(
+    module="src.external.jira",
+    name="jira_manager",
+)
@@ -0,0 +1,101 @@
+BATCH_URL = "$batch"
+# The maximum number of requests Microsoft Graph allows
+# within a single json batch request.
+BATCH_LIMIT = 20
+
+
+class GraphBatch:
+    def __init__(self, account):
+        """Initialize a new GraphBatch, requests added to the batch are sent to Microsoft Graph
+        using json batching, so every ``BATCH_LIMIT`` requests only take a single round trip.
+        """
+        self.account = account
+        self.requests = []
+
+    def _relative(self, url):
+        """Retrieve the ``url`` specified relative to the service url, urls built by O365 are absolute,
+        but requests within a batch must be relative to the service url.
+        """
+        service_url = self.account.protocol.service_url
+
+        if url.startswith(service_url):
+            url = url[len(service_url):]
+
+        return "/" + url.lstrip("/")
+
+    def add(self, method, url, body=None, key=None):
+        """Add a request to the batch, the ``key`` specified is included with the request's result
+        so results can be matched back up with whatever they were generated for.
+        """
+        request = {
+            "id": str(len(self.requests) + 1),
+            "method": method,
+            "url": self._relative(url),
+        }
+        if body is not None:
+            request["body"] = body
+            request["headers"] = {
+                "Content-Type": "application/json",
+            }
+
+        self.requests.append(
+            (key, request),
+        )
+
+    def send(self):
+        """Send every request added to the batch, returning a result for each request in the order
+        they were added.
+
+        [
+            {
+                "key": <KEY>,
+                "status": <HTTP_STATUS>,
+                "body": <RESPONSE_BODY>,
+                "error": <ERROR_MESSAGE | None>,
+            },
+        ]
+
+        Requests that fail are reported through their own result, a failure in one request
+        doesn't stop any of the others from being sent.
+        """
+        results = []
+
+        for index in range(0, len(self.requests), BATCH_LIMIT):
+            chunk = self.requests[index:index + BATCH_LIMIT]
+
+            try:
+                response = self.account.con.post(
+                    self.account.protocol.service_url + BATCH_URL,
+                    data={
+                        "requests": [request for key, request in chunk],
+                    },
+                )
+                responses = {
+                    r["id"]: r for r in response.json().get("responses", [])
+                }
+            except Exception as err:
+                # The batch itself has failed, every request
+                # within the batch has failed with it.
+                responses = {
+                    request["id"]: {"status": None, "body": {"error": {"message": str(err)}}}
+                    for key, request in chunk
+                }
+
+            for key, request in chunk:
+                result = responses.get(request["id"], {"status": None, "body": {}})
+                body = result.get("body") or {}
+                error = None
+
+                if result["status"] is None or result["status"] >= 400:
+                    error = body.get("error", {}).get("message", "No response received.")
+
+                results.append({
+                    "key": key,
+                    "status": result["status"],
+                    "body": body,
+                    "error": error,
+                })
+
+        self.requests = []
+
+        return results
@@ -1,5 +1,21 @@
+import time
+import logging
+import threading
+
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    wait,
+)
+
+from requests import (
+    Session,
+)
+from requests.adapters import (
+    HTTPAdapter,
+)
 from requests.exceptions import (
     HTTPError,
+    RequestException,
 )
 
 from atlassian import (
@@ -8,7 +24,31 @@ from atlassian import (
 
 from src.conf.config import (
     config,
+    cache,
+)
+
+# The issue fields cached, only the fields used when generating reports are ever
+# retrieved, "updated" is used to revalidate cached issues once they've expired.
+FIELDS = "summary,description,updated"
+# The http statuses that mean an issue either does not exist, or we don't have permission
+# to retrieve it's information, these are cached so the issue isn't retrieved again.
+MISSING_STATUSES = (
+    403,
+    404,
 )
+# The maximum number of issues retrieved by a single search
+# when prefetching issues, larger sets are split up.
+PREFETCH_CHUNK = 50
+# How long (in seconds) to wait for a connection to jira, and for jira
+# to respond, so a slow jira server can't hang report generation.
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+# The number of connections kept alive in the jira client's connection pool.
+POOL_SIZE = 8
+# The number of threads used to prefetch issues in the background.
+ENRICH_WORKERS = 2
+
+logger = logging.getLogger(__name__)
 
 
 class JiraManager:
@@ -16,34 +56,217 @@ class JiraManager:
         """Initialize a new JiraManager, exposing valid utilities used by the Workday
         app. Authentication is handled by collecting information from the user about
         their current Jira setup.
+
+        Issues are cached on disk, issues that don't exist are cached too, so reports
+        generated over the same issues don't need to retrieve anything from Jira.
         """
-        self._issues = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_settings = None
+        # Issues currently being prefetched in the background, mapped to the prefetch
+        # retrieving them, the cache is only ever written to by one thread at a time.
+        self._issues_lock = threading.Lock()
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=ENRICH_WORKERS,
+        )
 
     @property
     def _jira(self):
         """Utility method to generate the jira instance using the currently
         configured local jira settings set by the user.
+
+        The same instance (and it's pool of keep-alive connections) is reused until
+        the jira settings change, the instance is only ever generated again then.
         """
-        return Jira(
-            url=config.jira_url,
-            username=config.jira_username,
-            password=config.jira_token,
+        settings = (
+            config.jira_url,
+            config.jira_username,
+            config.jira_token,
         )
 
+        with self._lock:
+            if self._client is None or self._client_settings != settings:
+                if self._client is not None:
+                    self._client.close()
+
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=POOL_SIZE,
+                )
+                session = Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                self._client = Jira(
+                    url=config.jira_url,
+                    username=config.jira_username,
+                    password=config.jira_token,
+                    session=session,
+                )
+                # The client only accepts a single timeout, but it's passed to
+                # each request as is, so separate timeouts can be set afterwards.
+                self._client.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+                self._client_settings = settings
+
+            return self._client
+
+    def _cache_issues(self, issues):
+        """Cache the fields of each issue in the ``issues`` specified ({<issue>: <fields>}), ``None``
+        fields are cached for an issue that doesn't exist, everything is written to the cache at once.
+        """
+        cached = {
+            issue: {
+                "url": config.jira_url,
+                "fields": fields,
+                "checked": time.time(),
+            } for issue, fields in issues.items()
+        }
+        with self._issues_lock:
+            cache.update(
+                issues={
+                    **cache.issues,
+                    **cached,
+                },
+            )
+        return cached
+
+    def _expired(self, cached):
+        """Check to see if a ``cached`` issue has expired, issues that don't exist
+        expire sooner than issues that do.
+        """
+        ttl = config.jira_issue_ttl if cached["fields"] else config.jira_missing_issue_ttl
+
+        return cached["checked"] + ttl < time.time()
+
     def _get_issue(self, issue):
         """Retrieve an issue from Jira.
+
+        A cached issue is used until it expires, an expired issue is revalidated by only
+        retrieving the time it was last updated, it's fields are only retrieved again
+        when the issue has actually been updated since it was cached.
         """
-        if issue not in self._issues:
-            try:
-                self._issues[issue] = self._jira.issue(
+        if not issue:
+            # Branches that don't represent
+            # an issue are never retrieved.
+            return None
+
+        cached = cache.issues.get(issue)
+
+        if cached and cached["url"] != config.jira_url:
+            cached = None
+        if cached and not self._expired(cached):
+            return cached["fields"]
+
+        try:
+            if cached and cached["fields"]:
+                updated = self._jira.issue(
                     key=issue,
+                    fields="updated",
                 )
-            except HTTPError:
-                # An HTTPError in this case means the issue either does
-                # not exist, or we don't permission to retrieve it's information.
+                if updated["fields"]["updated"] == cached["fields"]["fields"]["updated"]:
+                    return self._cache_issues({issue: cached["fields"]})[issue]["fields"]
+
+            fields = self._jira.issue(
+                key=issue,
+                fields=FIELDS,
+            )
+        except HTTPError as err:
+            # An HTTPError in this case means the issue either does not exist, or we
+            # don't permission to retrieve it's information, anything else isn't cached.
+            if err.response is None or err.response.status_code not in MISSING_STATUSES:
                 return None
+            fields = None
+        except RequestException:
+            # The issue couldn't be retrieved at all (timeouts, connection
+            # errors, etc.), nothing is cached so it's retrieved again later.
+            logger.exception("Jira issue could not be retrieved.")
+            return None
+
+        return self._cache_issues({issue: fields})[issue]["fields"]
+
+    def _cached(self, issue):
+        """Check to see if an issue is cached and hasn't expired.
+        """
+        cached = cache.issues.get(issue)
+
+        return bool(cached and cached["url"] == config.jira_url and not self._expired(cached))
+
+    def enqueue(self, issues):
+        """Prefetch the ``issues`` specified in the background, issues already cached or already
+        being prefetched are skipped, nothing is prefetched when Jira is disabled.
+        """
+        if not config.jira_enabled:
+            return
+
+        with self._issues_lock:
+            issues = sorted(
+                set(issue for issue in issues if issue and issue not in self._inflight and not self._cached(issue))
+            )
+            if not issues:
+                return
+
+            future = self._executor.submit(self._prefetch, issues)
+
+            for issue in issues:
+                self._inflight[issue] = future
+
+        def done(_):
+            with self._issues_lock:
+                for i in issues:
+                    self._inflight.pop(i, None)
+
+        future.add_done_callback(done)
+
+    def prefetch(self, issues):
+        """Retrieve all of the ``issues`` specified that aren't already cached, using a single
+        search for every ``PREFETCH_CHUNK`` issues, so no issues need to be retrieved one at a time.
+
+        Issues already being prefetched in the background are waited on instead of being
+        retrieved again.
+        """
+        issues = set(issue for issue in issues if issue)
+
+        with self._issues_lock:
+            inflight = set(self._inflight[issue] for issue in issues if issue in self._inflight)
+
+        wait(inflight)
+
+        self._prefetch(issues)
+
+    def _prefetch(self, issues):
+        """Retrieve all of the ``issues`` specified that aren't already cached.
+
+        Issues missing from the search results don't exist (or we don't have permission to
+        retrieve their information), and are cached as such.
+        """
+        issues = sorted(set(issue for issue in issues if not self._cached(issue)))
+
+        for index in range(0, len(issues), PREFETCH_CHUNK):
+            chunk = issues[index:index + PREFETCH_CHUNK]
+            keys = ", ".join('"%s"' % issue.replace('"', '\\"') for issue in chunk)
+
+            try:
+                # Queries aren't validated, so any keys in the chunk that don't
+                # exist are ignored instead of failing the whole search.
+                found = {
+                    result["key"]: {"key": result["key"], "fields": result["fields"]}
+                    for result in self._jira.jql(
+                        jql=f"key in ({keys})",
+                        fields=FIELDS,
+                        limit=len(chunk),
+                        validate_query=False,
+                    ).get("issues", [])
+                }
+            except RequestException:
+                # Issues that can't be prefetched are just
+                # retrieved individually when they're used.
+                logger.exception("Jira issues could not be prefetched.")
+                continue
 
-        return self._issues[issue]
+            self._cache_issues({
+                issue: found.get(issue) for issue in chunk
+            })
 
     def issue_exists(self, issue):
         """Check to see if an issue exists in the Jira system available.
@@ -1,9 +1,19 @@
+import json
+import time
+import hashlib
+import logging
+import threading
 import webbrowser
 
-from rumps import (
-    Window,
-    alert,
-    notification,
+from datetime import (
+    date,
+    datetime,
+    time as dtime,
+    timedelta,
+)
+
+from requests import (
+    RequestException,
 )
 
 from O365 import (
@@ -16,6 +26,9 @@ from O365.utils import (
 from src.external.jira import (
     jira_manager,
 )
+from src.external.graph import (
+    GraphBatch,
+)
 
 from src.conf.conf import (
     MULTIPLE_EVENTS,
@@ -24,10 +37,15 @@ from src.conf.conf import (
 )
 from src.conf.config import (
     config,
+    cache,
+)
+from src.parse import (
+    history_available,
 )
 from src.utilities import (
     wait_for_result,
     strfdelta,
+    issue_key,
 )
 
 CLIENT_ID = "006bcaaa-d41f-47b5-a1e9-4c4035933190"
@@ -36,6 +54,34 @@ SCOPES = [
     "offline_access",
     "calendar_all",
 ]
+# How long (in seconds) before the access token expires
+# that it's refreshed in the background.
+REFRESH_MARGIN = 300
+# How long (in seconds) to wait before retrying a failed refresh, the wait is
+# doubled after every failure, up to the maximum wait between retries.
+REFRESH_RETRY = 60
+REFRESH_RETRY_MAX = 60 * 60
+# How long (in seconds) the cached snapshot of the calendars
+# available is used before it's revalidated in the background.
+CALENDARS_TTL = 60 * 60 * 24
+# Every event created by Workday is tagged with these extended properties, the fingerprint
+# identifies the itinerary entry an event represents (repository, branch, start), and the
+# digest identifies the contents of the event, so unchanged events are never written again.
+PROPERTY_SET = "{3f2b9c71-5e04-4d8a-a6c1-7b9e0d4f2a56}"
+FINGERPRINT = "WorkdayFingerprint"
+DIGEST = "WorkdayDigest"
+FINGERPRINT_PROPERTY = f"String {PROPERTY_SET} Name {FINGERPRINT}"
+DIGEST_PROPERTY = f"String {PROPERTY_SET} Name {DIGEST}"
+# The number of events retrieved in each page of a calendar view.
+EVENTS_PAGE_SIZE = 100
+# The http method used to apply each type of change planned for an itinerary.
+ACTIONS = {
+    "create": "POST",
+    "update": "PATCH",
+    "delete": "DELETE",
+}
+
+logger = logging.getLogger(__name__)
 
 
 class WorkdayTokenBackend(BaseTokenBackend):
@@ -79,8 +125,12 @@ class OutlookManager:
         """Initialize a new OutlookManager, ensuring scopes, clients and
         credentials are set up correctly. We also create the ``account`` object here
         and handle the custom TokenBackend before any authentication takes place.
+
+        The same ``account`` (and it's http session) is used for the life of the manager.
         """
-        self._calendars = {}
+        self._revalidating = threading.Lock()
+        self._authenticated = None
+        self._refresh = None
         self._scopes = SCOPES
         self._client_id = CLIENT_ID
         self._auth_type = AUTH_TYPE
@@ -100,50 +150,168 @@ class OutlookManager:
     @property
     def authenticated(self):
         """Return a boolean representing if the Outlook account is authenticated.
+
+        The authentication state is cached, keyed on the stored token and it's expiry, so the
+        token is only loaded again once it's been changed (granted, revoked or refreshed).
         """
-        self.account = Account(
-            credentials=self._credentials,
-            auth_flow_type=self._auth_type,
-            token_backend=WorkdayTokenBackend(),
+        token = config.outlook_token or {}
+        key = (
+            token.get("access_token"),
+            token.get("expires_at"),
         )
-        return self.account.is_authenticated
+
+        if (
+            self._authenticated is None
+            or self._authenticated[0] != key
+            or datetime.now() > self._authenticated[2]
+        ):
+            self._authenticated = (key, *self._load_token())
+
+        return self._authenticated[1]
+
+    def _load_token(self):
+        """Load the stored token into the account, returning a tuple containing the current
+        authentication state and the datetime that state expires.
+
+        The account's http session is only discarded if the token loaded isn't the
+        token the account is already using (authentication was granted or revoked).
+        """
+        backend = self.account.con.token_backend
+        token = backend.load_token()
+
+        if token != backend.token:
+            backend.token = token
+            self.account.con.session = None
+
+        self._schedule_refresh(token=token)
+
+        if token is None or token.is_expired:
+            return False, datetime.max
+
+        return True, token.expiration_datetime
+
+    def _schedule_refresh(self, token):
+        """Schedule the access token to be refreshed in the background shortly before it
+        expires, so generating reports never has to wait for the token to be refreshed.
+        """
+        if self._refresh:
+            self._refresh.cancel()
+            self._refresh = None
+
+        if token is None or token.is_expired or not token.is_long_lived:
+            return
+
+        delay = (token.access_expiration_datetime - datetime.now()).total_seconds() - REFRESH_MARGIN
+
+        self._refresh = threading.Timer(
+            interval=max(delay, 0),
+            function=self._refresh_token,
+        )
+        self._refresh.daemon = True
+        self._refresh.start()
+
+    def _refresh_token(self, retry=REFRESH_RETRY):
+        """Refresh the access token, the refreshed token is saved through the token backend,
+        and the next refresh is scheduled right away.
+
+        A failed refresh (offline, server errors) is retried after ``retry`` seconds, backing off
+        after every failure, for as long as the refresh token itself is still valid.
+        """
+        try:
+            self.account.con.refresh_token()
+        except Exception:
+            logger.exception("Outlook token refresh has failed.")
+
+            token = self.account.con.token_backend.token
+
+            if token is None or token.is_expired or not token.is_long_lived:
+                return
+
+            self._refresh = threading.Timer(
+                interval=retry,
+                function=self._refresh_token,
+                kwargs={
+                    "retry": min(retry * 2, REFRESH_RETRY_MAX),
+                },
+            )
+            self._refresh.daemon = True
+            self._refresh.start()
+        else:
+            self._schedule_refresh(token=self.account.con.token_backend.token)
 
     @property
     def calendar_choices(self):
         """Return a list of all available Calendars within the Outlook account.
+
+        Calendars are taken from the snapshot cached on disk, a missing or stale snapshot
+        is revalidated in the background, so building the menu never waits on the network.
         """
-        if not self._calendars:
-            if self.authenticated:
-                default = self.account.schedule().get_default_calendar()
-                # {
-                #     "default" : <DEFAULT_CALENDAR>,
-                #     "<CALENDAR_NAME>: <CALENDAR>,
-                #     ...
-                # }
-                self._calendars = {
-                    DEFAULT_CALENDAR: default,
+        if self.authenticated and (cache.calendars_updated or 0) + CALENDARS_TTL < time.time():
+            threading.Thread(
+                target=self._revalidate_calendars,
+                daemon=True,
+            ).start()
+
+        return list(cache.calendars)
+
+    def _revalidate_calendars(self):
+        """Retrieve all available Calendars within the Outlook account, updating the cached
+        snapshot of their names and ids, only one revalidation is ever done at a time.
+        """
+        if not self._revalidating.acquire(blocking=False):
+            return
+
+        try:
+            schedule = self.account.schedule()
+            default = schedule.get_default_calendar()
+            # {
+            #     "default" : {"id": <DEFAULT_CALENDAR_ID>, "name": <DEFAULT_CALENDAR_NAME>},
+            #     "<CALENDAR_NAME>: {"id": <CALENDAR_ID>, "name": <CALENDAR_NAME>},
+            #     ...
+            # }
+            cache.update(
+                calendars={
+                    DEFAULT_CALENDAR: {"id": default.calendar_id, "name": default.name},
                     **{
-                        c.name: c
-                        for c in self.account.schedule().list_calendars() if c.name != default.name
+                        c.name: {"id": c.calendar_id, "name": c.name}
+                        for c in schedule.list_calendars() if c.name != default.name
                     }
-                }
-
-        return self._calendars
+                },
+                calendars_updated=time.time(),
+            )
+        except Exception:
+            # The snapshot available is left as is, it's
+            # revalidated again the next time it's used.
+            logger.exception("Outlook calendar revalidation has failed.")
+        finally:
+            self._revalidating.release()
 
     def _calendar(self):
         """Retrieve the currently configured calendar, this can be either the "Default Calendar",
         or one of the dynamically available calendars available within a users account.
+
+        The calendar is built from the cached snapshot, so no request is needed to find it,
+        a calendar without an id (no snapshot available yet) is the user's default calendar.
         """
         schedule = self.account.schedule()
-        calendar = self._calendars[config.outlook_calendar]
+        calendar = cache.calendars.get(config.outlook_calendar, {})
 
-        return calendar
+        return schedule.calendar_constructor(
+            parent=schedule,
+            **{schedule._cloud_data_key: calendar},
+        )
 
     @staticmethod
     def handle_consent_cb(consent_url):
         """When handling an authentication flow with consent, we use this callback to capture
         the consented url when a user logs into their Outlook account and grants access.
         """
+        # Imported here so the manager can be used without a menu bar available.
+        from rumps import (
+            Window,
+            notification,
+        )
+
         webbrowser.open_new_tab(
             url=consent_url,
         )
@@ -177,7 +345,13 @@ class OutlookManager:
         """Authenticate the user if an existing authentication token doesn't already exist
         in the users token backend.
         """
-        if not self.account.is_authenticated:
+        # Imported here so the manager can be used without a menu bar available.
+        from rumps import (
+            alert,
+            notification,
+        )
+
+        if not self.authenticated:
             result = alert(
                 title="Outlook Authentication Required",
                 message=(
@@ -222,7 +396,7 @@ class OutlookManager:
             duration = instance["end"] - instance["start"]
             # Otherwise, we're generating the subject for a single issue.
             # Using Jira to find the subject.
-            if config.jira_enabled:
+            if config.jira_enabled and issue:
                 if jira_manager.issue_exists(issue=issue):
                     summary = jira_manager.issue_summary(issue=issue)
                     return (
@@ -248,7 +422,7 @@ class OutlookManager:
             # Single event body should use a more complex lookup
             # to find each issues description to include.
             for issue in issues:
-                if config.jira_enabled:
+                if config.jira_enabled and issue:
                     if jira_manager.issue_exists(issue=issue):
                         descriptions[issue] = jira_manager.issue_description(issue=issue)
 
@@ -277,7 +451,7 @@ class OutlookManager:
             body = (
                 f"{branch} ({strfdelta(duration)})"
             )
-            if config.jira_enabled:
+            if config.jira_enabled and issue:
                 if jira_manager.issue_exists(issue=issue):
                     description = jira_manager.issue_description(issue=issue)
                     body += (
@@ -288,22 +462,117 @@ class OutlookManager:
             # to a basic description.
             return body + "<br /><br />Generated By src."
 
+    @staticmethod
+    def _event_url(calendar, event_id=None):
+        """Retrieve the url used to create a new event in a ``calendar``, or the url of
+        an existing event when an ``event_id`` is specified.
+        """
+        endpoints = calendar.event_constructor._endpoints
+
+        if event_id:
+            return calendar.build_url(endpoints.get("event").format(id=event_id))
+        if calendar.calendar_id:
+            return calendar.build_url(endpoints.get("event_calendar").format(id=calendar.calendar_id))
+        return calendar.build_url(endpoints.get("event_default"))
+
+    @staticmethod
+    def _fingerprint(repository, branch, start):
+        """Retrieve the fingerprint of an itinerary entry, the fingerprint stays the same between
+        reports, so the event previously created for an entry can always be found again.
+        """
+        return json.dumps([repository, branch, start.isoformat()])
+
+    @staticmethod
+    def _tag(event, fingerprint):
+        """Retrieve the api data for an ``event``, tagged with it's ``fingerprint`` and the
+        digest of it's contents, returned as a tuple containing the (<digest>, <data>).
+        """
+        data = event.to_api_data()
+        digest = hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+        data["singleValueExtendedProperties"] = [
+            {"id": FINGERPRINT_PROPERTY, "value": fingerprint},
+            {"id": DIGEST_PROPERTY, "value": digest},
+        ]
+        return digest, data
+
+    def _existing_events(self, calendar, start, end):
+        """Retrieve the events previously created by Workday in a ``calendar`` between the ``start``
+        and ``end`` datetimes specified, grouped by their fingerprint.
+
+        {
+            "<FINGERPRINT>": [
+                {"id": <EVENT_ID>, "subject": <SUBJECT>, "digest": <DIGEST>},
+            ],
+        }
+
+        A single calendar view is used, limited to the ids, subjects and Workday properties of each
+        event, events without a fingerprint weren't created by Workday and are left out.
+        """
+        if calendar.calendar_id:
+            url = calendar.build_url(calendar._endpoints.get("events_view").format(id=calendar.calendar_id))
+        else:
+            url = calendar.build_url(calendar._endpoints.get("default_events_view"))
+
+        params = {
+            "startDateTime": start.isoformat(),
+            "endDateTime": end.isoformat(),
+            "$select": "id,subject",
+            "$expand": (
+                f"singleValueExtendedProperties($filter=id eq '{FINGERPRINT_PROPERTY}' "
+                f"or id eq '{DIGEST_PROPERTY}')"
+            ),
+            "$top": EVENTS_PAGE_SIZE,
+        }
+        existing = {}
+
+        while url:
+            response = self.account.con.get(url, params=params).json()
+
+            for event in response.get("value", []):
+                properties = {
+                    prop["id"].split()[-1]: prop["value"] for prop in event.get("singleValueExtendedProperties", [])
+                }
+                if FINGERPRINT in properties:
+                    existing.setdefault(properties[FINGERPRINT], []).append({
+                        "id": event["id"],
+                        "subject": event.get("subject"),
+                        "digest": properties.get(DIGEST),
+                    })
+            # The next page's url already includes
+            # every parameter used to retrieve the view.
+            url, params = response.get("@odata.nextLink"), None
+
+        return existing
+
     def generate_itinerary_multiple_events(self, calendar, itinerary):
-        """Generate Outlook Events that represent the specified itinerary.
+        """Generate Outlook Events that represent the specified itinerary, returned as
+        a list of (<fingerprint>, <event>) tuples, nothing is saved here.
         """
+        events = []
+
         for instance in itinerary:
             event = calendar.new_event()
             event.subject = self.generate_event_subject(instance=instance)
             event.body = self.generate_event_body(instance=instance)
             event.start = instance["start"]
             event.end = instance["end"]
-            event.save()
+            events.append((
+                self._fingerprint(
+                    repository=instance["repository"],
+                    branch=instance["branch"],
+                    start=instance["start"],
+                ),
+                event,
+            ))
+        return events
 
     def generate_itinerary_single_event(self, calendar, itinerary):
-        """Generate Outlook Event that represents the specified itinerary.
+        """Generate Outlook Event that represents the specified itinerary, returned as
+        a list containing a single (<fingerprint>, <event>) tuple, nothing is saved here.
         """
         branches = set(instance["branch"] for instance in itinerary)
-        issues = [b.split("/")[-1] if "/" in b else b for b in branches]
+        issues = [issue_key(branch=b, pattern=config.issue_pattern) for b in branches]
         single_itinerary = {
             "start": itinerary[0]["start"],
             "end": itinerary[-1]["end"],
@@ -324,32 +593,145 @@ class OutlookManager:
         event.subject = self.generate_event_subject(instance=single_itinerary, single_event=True)
         event.body = self.generate_event_body(instance=single_itinerary, single_event=True)
 
-        event.save()
-
-    def generate_itinerary(self, itinerary, itinerary_type):
-        """Generate Outlook Event(s) that represent the itinerary available.
-
-        The ``itinerary_type`` specified is used to determine how the ``itinerary`` itself
-        is transformed into an Outlook instance.
+        # The single event represents the whole itinerary,
+        # so it isn't fingerprinted with any single branch.
+        return [(
+            self._fingerprint(
+                repository=itinerary[0]["repository"],
+                branch=None,
+                start=single_itinerary["start"],
+            ),
+            event,
+        )]
+
+    def plan_itinerary(self, repository, itinerary, itinerary_type, start=None, end=None):
+        """Plan the changes required for the Outlook Event(s) in the configured calendar to match
+        the itinerary available for a ``repository`` from the ``start`` date (inclusive) to the ``end``
+        date (exclusive), only the current day is used by default. Nothing is written when planning.
+
+        [
+            {
+                "action": "create" | "update" | "delete",
+                "url": <EVENT_URL>,
+                "subject": <SUBJECT>,
+                "data": <API_DATA | None>,
+            },
+        ]
+
+        Events are matched up with the events previously created for the itinerary using their
+        fingerprint, events whose contents haven't changed are left out of the plan, and events
+        previously created for the repository within the window that match nothing are deleted,
+        so an empty itinerary deletes every event previously created for the window.
+
+        Events are only ever deleted when the refs stored for the repository cover the window,
+        missing history (compacted, deleted or expired) never deletes anything.
         """
-        if not self.account.is_authenticated:
+        if not self.authenticated:
             raise ValueError(
                 "Validation has failed, only call functionality that makes use of the "
                 "O365 API once access/consent has been granted to the application."
             )
 
-        calendar = self._calendar()
-
         if itinerary_type not in self.itinerary_map:
             raise ValueError(
                 f"``itinerary_type``: \"{itinerary_type}\" is not currently supported."
             )
 
-        itinerary_func = self.itinerary_map[itinerary_type]
-        itinerary_func(
+        start = start or date.today()
+        end = end or start + timedelta(days=1)
+
+        if config.jira_enabled:
+            # Every issue is retrieved up front, so generating
+            # each event never has to wait on Jira.
+            jira_manager.prefetch(
+                issues=[instance["issue"] for instance in itinerary if instance["issue"]],
+            )
+
+        calendar = self._calendar()
+        existing = self._existing_events(
             calendar=calendar,
-            itinerary=itinerary,
+            start=datetime.combine(start, dtime.min).astimezone(),
+            end=datetime.combine(end, dtime.min).astimezone(),
         )
+        plan = []
+
+        events = self.itinerary_map[itinerary_type](calendar=calendar, itinerary=itinerary) if itinerary else []
+
+        for fingerprint, event in events:
+            digest, data = self._tag(event=event, fingerprint=fingerprint)
+            matches = existing.pop(fingerprint, [])
+
+            if not matches:
+                plan.append({
+                    "action": "create",
+                    "url": self._event_url(calendar=calendar),
+                    "subject": event.subject,
+                    "data": data,
+                })
+                continue
+
+            if matches[0]["digest"] != digest:
+                plan.append({
+                    "action": "update",
+                    "url": self._event_url(calendar=calendar, event_id=matches[0]["id"]),
+                    "subject": event.subject,
+                    "data": data,
+                })
+            # Any other events with the same fingerprint are
+            # duplicates, only a single event is ever kept.
+            existing[fingerprint] = matches[1:]
+
+        if not history_available(repository=repository, start=start, end=end):
+            return plan
+
+        for fingerprint, matches in existing.items():
+            if json.loads(fingerprint)[0] == repository:
+                for match in matches:
+                    plan.append({
+                        "action": "delete",
+                        "url": self._event_url(calendar=calendar, event_id=match["id"]),
+                        "subject": match["subject"],
+                        "data": None,
+                    })
+        return plan
+
+    def generate_itinerary(self, repository, itinerary, itinerary_type, start=None, end=None):
+        """Generate Outlook Event(s) that represent the itinerary available for a ``repository``
+        from the ``start`` date (inclusive) to the ``end`` date (exclusive).
+
+        The ``itinerary_type`` specified is used to determine how the ``itinerary`` itself
+        is transformed into an Outlook instance, only the changes planned for the itinerary
+        are made, using json batching, so generating the same itinerary again does nothing.
+
+        A list of errors is returned for any events that could not be created, updated or deleted.
+        """
+        try:
+            plan = self.plan_itinerary(
+                repository=repository,
+                itinerary=itinerary,
+                itinerary_type=itinerary_type,
+                start=start,
+                end=end,
+            )
+        except RequestException:
+            logger.exception("Outlook events could not be retrieved.")
+            return [
+                "The existing itinerary events could not be retrieved.",
+            ]
+
+        batch = GraphBatch(account=self.account)
+
+        for change in plan:
+            batch.add(
+                method=ACTIONS[change["action"]],
+                url=change["url"],
+                body=change["data"],
+                key=change["subject"],
+            )
+
+        return [
+            f"{result['key']}: {result['error']}" for result in batch.send() if result["error"]
+        ]
 
 
 outlook_manager = OutlookManager()
@@ -1,196 +1,621 @@
+import os
+import sys
+import mmap
 import hashlib
-import copy
 
 from datetime import (
     date,
     datetime,
     timedelta,
 )
+from collections import (
+    defaultdict,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from itertools import (
+    groupby,
+)
 from subprocess import (
-    check_output,
+    Popen,
+    PIPE,
+    DEVNULL,
     CalledProcessError,
 )
 
 from src.conf.conf import (
     DURATION_MAP,
     HOUR_MAP,
+    TIMESTAMP_FORMAT,
+    WORKDAY_END_TIME,
 )
 from src.conf.config import (
     config,
     data,
 )
+from src.conf.store import (
+    Ref,
+    offset_timezone,
+    day_number,
+)
+from src.utilities import (
+    issue_key,
+)
+
+# Minimum length git will abbreviate a commit to when outputting
+# the reflog, used when reading reflog files directly.
+ABBREV_LENGTH = 7
 
 
 class RepositoryParser(object):
     """Encapsulate all parsing functionality used when a repository is passed along
     from the application to have it's information refreshed.
     """
-    def __init__(self, repository):
+    def __init__(self, repository, enrich=None):
         self.repository = repository
-        self.hashes = {}
+        # Called with the issues of any refs found within the window being
+        # generated, so issues can be enriched while the repository is parsed.
+        self.enrich = enrich
+        self.window = None
+        self.hashes = set()
         self.parsed = {}
+        self.cursor = None
+        self.offsets = {}
+        self.abbrev = None
+        self.tracked = False
+        self.pending = []
         self.load()
 
+    @staticmethod
+    def _issue(branch):
+        """Retrieve the issue a ``branch`` represents, ``None`` is returned if the branch doesn't
+        contain anything matching the configured issue pattern.
+        """
+        return issue_key(
+            branch=branch,
+            pattern=config.issue_pattern,
+        )
+
+    def _enrich(self, refs):
+        """Pass the issues of any ``refs`` within the window being generated along to be enriched,
+        nothing is done if the repository isn't being generated or there's nothing to enrich with.
+        """
+        if not self.enrich or not self.window:
+            return
+
+        start, end = self.window
+        issues = set(
+            self._issue(ref.current) for ref in refs if start <= ref.day < end
+        )
+        issues.discard(None)
+        if issues:
+            self.enrich(issues)
+
+    @staticmethod
+    def _timestamp(ref):
+        """Retrieve the timestamp from the selector of a raw reflog entry.
+        """
+        return datetime.strptime(
+            ref[ref.find("{") + 1:ref.find("}")],
+            TIMESTAMP_FORMAT,
+        )
+
     def _make_hashes(self, reflog):
-        """Generate hashes for reflog entries available.
+        """Generate hashes for reflog entries available, returning (<hash>, <entry>) tuples
+        for any entries that haven't been seen before during this parse.
+
+        Only the raw md5 digest of each entry is kept to know if an entry has already been
+        seen, entries that were stored by a previous parse are ignored by the data store.
         """
+        hashes = []
+
         for ref in reflog:
-            if ref not in self.hashes.values():
-                self.hashes[hashlib.md5(ref.encode()).hexdigest()] = ref
+            _hash = hashlib.md5(ref.encode()).digest()
+            if _hash not in self.hashes:
+                self.hashes.add(_hash)
+                hashes.append(
+                    (_hash, ref),
+                )
+
+        return hashes
 
-    def _make_parsed(self):
-        """Generate parsed reflog entries.
+    def _make_parsed(self, hashes):
+        """Generate parsed reflog entries for the (<hash>, <entry>) ``hashes`` specified.
         """
-        for _hash, ref in self.hashes.items():
+        for _hash, ref in hashes:
             if _hash not in self.parsed:
                 # 48c2f7c02a (HEAD -> 4.9, origin/feature/IRISDEV-1788) HEAD@{2021-07-09 18:32:12 -0300}: checkout: moving from feature/IRISDEV-1051 to 4.9
                 # commit: "48c2f7c02a"
                 # datetime: "2021-07-09 18:32:12 -0300"
-                # message: "checkout: moving from feature/IRISDEV-1051 to 4.9"
-                commit, timestamp, message, previous, current = (
+                # previous: "feature/IRISDEV-1051"
+                # current: "4.9"
+                commit, timestamp, previous, current = (
                     ref.split(" ")[0],
                     ref[ref.find("{") + 1:ref.find("}")],
-                    ref[ref.find("checkout: "):],
                     ref[ref.find("from ") + 5:ref.find(" to")],
                     ref[ref.find("to ") + 3:],
                 )
-                self.parsed[_hash] = {
-                    "commit": commit,
-                    "timestamp": timestamp,
-                    "message": message,
-                    "previous": previous,
-                    "current": current,
-                }
+                # The epoch and utc offset (in seconds) are computed once here so
+                # the timestamp never needs to be parsed again when generating reports,
+                # branches are interned since most refs move between the same few branches.
+                timestamp = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+                self.parsed[_hash] = Ref(
+                    commit,
+                    int(timestamp.timestamp()),
+                    int(timestamp.utcoffset().total_seconds()),
+                    sys.intern(previous),
+                    sys.intern(current),
+                )
 
-    def reflog(self):
-        """Retrieve the raw reflog output for the specified repository.
+    def _make_cursor(self, reflog):
+        """Generate the cursor for the repository, the cursor is the timestamp of
+        the newest reflog entry handled, anything older has already been parsed.
+        """
+        for ref in reflog:
+            timestamp = self._timestamp(ref)
+            if self.cursor is None or timestamp > self.cursor:
+                self.cursor = timestamp
+
+    def _read_log(self, path, selector, abbrev):
+        """Read the entries appended to a single reflog file since the last time it was read.
+
+        The file is memory mapped and only the bytes after the saved offset are read,
+        each entry is transformed into the same format "git reflog --date=iso" outputs.
+        """
+        reflog = []
+        offset = self.offsets.get(selector, 0)
+
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+
+            if size == 0:
+                self.offsets[selector] = 0
+                return reflog
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if offset > size or (offset and mapped[offset - 1:offset] != b"\n"):
+                    # The reflog has been expired or rewritten since we last read it,
+                    # start from the beginning, the cursor filters anything already parsed.
+                    offset = 0
+
+                # Only complete entries are read, a partially written
+                # entry will be picked up by the next read instead.
+                end = mapped.rfind(b"\n", offset) + 1
+                if end <= offset:
+                    return reflog
+                entries = mapped[offset:end].decode(errors="replace")
+
+        self.offsets[selector] = end
+
+        # 7a2118 4ada65 Name <email> 1792301594 +0000\tcheckout: moving from develop to feature/ABC-1
+        for entry in entries.splitlines():
+            header, _, message = entry.partition("\t")
+            header, seconds, zone = header.rsplit(" ", 2)
+            sign = -1 if zone[0] == "-" else 1
+            timestamp = datetime.fromtimestamp(
+                int(seconds),
+                tz=offset_timezone(sign * (int(zone[1:3]) * 3600 + int(zone[3:5]) * 60)),
+            )
+            if self.cursor and timestamp < self.cursor:
+                continue
+            commit = header.split(" ")[1][:abbrev]
+            reflog.append(
+                f"{commit} {selector}@{{{timestamp.strftime(TIMESTAMP_FORMAT)}}}: {message}"
+            )
+
+        return reflog
+
+    def _reflog_native(self):
+        """Retrieve the raw reflog entries for the specified repository by reading the
+        ".git/logs" directory directly, skipping the git process entirely.
+
+        ``None`` is returned when the repository layout isn't one that can be read directly
+        (worktrees, submodules, reftable storage), in which case git itself should be used.
+        """
+        git = os.path.join(self.repository, ".git")
+        logs = os.path.join(git, "logs")
+
+        if (
+            not os.path.isdir(git)
+            or os.path.exists(os.path.join(git, "reftable"))
+            or not os.path.isfile(os.path.join(logs, "HEAD"))
+        ):
+            return None
+
+        # Commits are abbreviated to the same length as the entries already
+        # parsed so hashes match those generated from git's own output.
+        abbrev = self.abbrev or ABBREV_LENGTH
+
+        paths = [(os.path.join(logs, "HEAD"), "HEAD")]
+        for root, dirs, files in os.walk(os.path.join(logs, "refs")):
+            for file in files:
+                path = os.path.join(root, file)
+                paths.append((path, os.path.relpath(path, logs).replace(os.sep, "/")))
+
+        reflog = []
+        for path, selector in paths:
+            reflog.extend(
+                self._read_log(path=path, selector=selector, abbrev=abbrev),
+            )
+        return reflog
+
+    def _reflog_git(self):
+        """Retrieve the raw reflog entries for the specified repository using git.
+
+        The reflog is output newest first, so we only read entries until one older
+        than the current cursor is reached, the rest of the output is never read.
+        Entries that share the cursor's timestamp are still returned, hashing takes
+        care of any duplicates.
         """
-        return check_output(
+        reflog = []
+        stopped = False
+
+        with Popen(
             ["git", "reflog", "--date=iso", "--all"],
-            cwd=self.repository
-        )
+            cwd=self.repository,
+            stdout=PIPE,
+            stderr=DEVNULL,
+        ) as process:
+            for ref in process.stdout:
+                ref = ref.decode().rstrip("\n")
+                if not ref:
+                    continue
+                if self.cursor and self._timestamp(ref) < self.cursor:
+                    stopped = True
+                    process.kill()
+                    break
+                reflog.append(
+                    ref,
+                )
+
+        if not stopped and process.returncode:
+            raise CalledProcessError(
+                returncode=process.returncode,
+                cmd=process.args,
+            )
+
+        return reflog
+
+    def reflog(self):
+        """Retrieve the raw reflog entries for the specified repository, reading the reflog
+        files directly when possible and falling back to git otherwise.
+        """
+        reflog = self._reflog_native()
+
+        if reflog is None:
+            reflog = self._reflog_git()
+
+        return reflog
 
     def load(self):
         """Handle loading a repository initially in case it's already been parsed
         before, in which case, a lot of parsing functionality can be skipped.
         """
-        if self.repository in data.tracked:
-            self.hashes = data.tracked[self.repository]["hashes"]
-            self.parsed = data.tracked[self.repository]["parsed"]
+        tracked = data.repository(self.repository)
+
+        if tracked is not None:
+            self.tracked = True
+            self.offsets = tracked["offsets"]
+            self.abbrev = data.abbrev(self.repository)
+
+            if tracked["cursor"]:
+                self.cursor = datetime.strptime(
+                    tracked["cursor"],
+                    TIMESTAMP_FORMAT,
+                )
+
+    def collect(self):
+        """Collect any new reflog entries for the repository, parsing them without writing
+        anything to the data store, ``True`` is returned if there's anything new to store.
+
+        Nothing here touches the data store, so multiple repositories can safely
+        be collected at the same time.
+        """
+        offsets = dict(self.offsets)
+        reflog = self.reflog()
+
+        # Currently only taking "checkout" commands from
+        # the reflog to track how long a user is on a given branch,
+        # this could be enhanced to track different or more commands.
+        reflog = [ref for ref in reflog if "checkout:" in ref]
+
+        if not reflog and self.offsets == offsets and self.tracked:
+            # Nothing new since the last parse, no need to
+            # update any of the tracked data available.
+            return False
+
+        hashes = self._make_hashes(reflog)
+
+        self._make_parsed(
+            hashes=hashes,
+        )
+        self.pending = [_hash for _hash, _ in hashes]
+        self._make_cursor(reflog)
+        self._enrich(self.parsed[_hash] for _hash in self.pending)
+
+        return True
+
+    def store(self):
+        """Store the reflog entries collected for the repository in the data store.
+        """
+        data.insert(
+            repository=self.repository,
+            refs=((_hash, self.parsed[_hash]) for _hash in self.pending),
+        )
+        data.update(
+            repository=self.repository,
+            cursor=self.cursor.strftime(TIMESTAMP_FORMAT) if self.cursor else None,
+            offsets=self.offsets,
+        )
+
+        # Raw reflog entries are only needed until they've been
+        # parsed, nothing is held once everything is stored.
+        self.tracked = True
+        self.pending = []
+        self.hashes = set()
+        self.parsed = {}
 
     def parse(self):
         """Handle parsing a repository, loading the reflogs output and parsing
         and updating information for the repository in the data file available.
         """
         try:
-            reflog = self.reflog()
-        except CalledProcessError:
+            if self.collect():
+                self.store()
+        except (CalledProcessError, OSError):
             # Early return, anything better here?
             return
 
-        # Currently only taking "checkout" commands from
-        # the reflog to track how long a user is on a given branch,
-        # this could be enhanced to track different or more commands.
-        reflog = reflog.decode()
-        reflog = [ref for ref in reflog.split("\n") if ref and "checkout:" in ref]
+    @staticmethod
+    def _pairs(refs):
+        """Yield each ref alongside the ref that follows it, the last ref
+        available is paired with ``None``.
+        """
+        refs = iter(refs)
+        ref_one = next(refs, None)
 
-        self._make_hashes(reflog)
-        self._make_parsed()
+        for ref_two in refs:
+            yield ref_one, ref_two
+            ref_one = ref_two
 
-        tracked = data.tracked
-        tracked[self.repository] = {
-            "hashes": self.hashes,
-            "parsed": self.parsed,
-        }
+        if ref_one is not None:
+            yield ref_one, None
 
-        data.update(
-            tracked=tracked,
+    def _generate_day(self, refs):
+        """Generate the events for a single day using the ``refs`` available from that day,
+        refs are expected to be ordered by their timestamp.
+        """
+        events = []
+        minimum = timedelta(minutes=DURATION_MAP[config.minimum_event_duration])
+
+        start_hour = HOUR_MAP.get(config.hardcoded_start_time)
+        end_hour = HOUR_MAP.get(config.hardcoded_end_time)
+
+        for ref_one, ref_two in self._pairs(refs):
+            start = datetime.fromtimestamp(ref_one.epoch, tz=offset_timezone(ref_one.offset))
+            now = datetime.now(tz=start.tzinfo)
+
+            if ref_two is not None:
+                end = datetime.fromtimestamp(ref_two.epoch, tz=offset_timezone(ref_two.offset))
+            elif start.date() == now.date():
+                # No ref two means this is the last ref available, the itinerary
+                # entry is generated up until now on the current day.
+                end = now
+            else:
+                # The day has already passed, so the last itinerary entry ends at the
+                # end of the workday instead of running on until midnight.
+                end = start.replace(
+                    hour=end_hour or HOUR_MAP[WORKDAY_END_TIME],
+                    minute=0,
+                    second=0,
+                    microsecond=0,
+                )
+
+            if start_hour is not None:
+                start = max(start, start.replace(
+                    hour=start_hour,
+                    minute=0,
+                    second=0,
+                    microsecond=0,
+                ))
+            if end_hour is not None:
+                end = min(end, start.replace(
+                    hour=end_hour,
+                    minute=0,
+                    second=0,
+                    microsecond=0,
+                ))
+
+            duration = end - start
+
+            if duration > minimum:
+                events.append({
+                    "repository": self.repository,
+                    "start": start,
+                    "end": end,
+                    "duration": duration,
+                    "branch": ref_one.current,
+                    "issue": self._issue(ref_one.current),
+                })
+        return events
+
+    def stream(self, start=None, end=None, parse=True):
+        """Stream the events of every day from the ``start`` date (inclusive) to the ``end`` date
+        (exclusive), only the current day is included by default. The repository is parsed first
+        unless ``parse`` is ``False`` (the repository has already been parsed).
+
+        Refs are read from the data store as they're needed and events are yielded one day
+        at a time, so only a single day's events are ever held in memory, no matter how
+        many days are streamed.
+
+        When the parser has something to ``enrich`` with, the issues already stored within the
+        window are passed along before the repository is parsed, and any new issues are passed
+        along as soon as they're parsed, so enrichment is done while the repository is parsed.
+        """
+        start = start or date.today()
+        end = end or start + timedelta(days=1)
+
+        self.window = (day_number(start), day_number(end))
+        self._enrich(
+            data.refs(
+                repository=self.repository,
+                start=start.isoformat(),
+                end=end.isoformat(),
+            ),
+        )
+        if parse:
+            self.parse()
+
+        # Refs are ordered by day and then by their epoch, so each day's
+        # refs are available one after the other.
+        for day, refs in groupby(
+            data.refs(
+                repository=self.repository,
+                start=start.isoformat(),
+                end=end.isoformat(),
+            ),
+            key=lambda x: x.day,
+        ):
+            yield from self._generate_day(refs)
+
+    def compact(self, weeks):
+        """Compact every day older than the retention window of ``weeks`` weeks, each day is rolled up
+        into the total time spent on each branch that day, and the refs from those days are pruned.
+
+        ``True`` is returned if anything was compacted, nothing is ever compacted without a (positive) retention window.
+        """
+        if not weeks or weeks < 0:
+            return False
+
+        cutoff = date.today() - timedelta(weeks=weeks)
+        oldest = data.oldest(self.repository)
+
+        if oldest is None or oldest >= cutoff.isoformat():
+            return False
+
+        totals = defaultdict(int)
+
+        for event in self.stream(start=date.fromisoformat(oldest), end=cutoff, parse=False):
+            totals[(event["start"].date().isoformat(), event["branch"])] += int(event["duration"].total_seconds())
+
+        data.compact(
+            repository=self.repository,
+            before=cutoff.isoformat(),
+            totals=totals,
         )
+        return True
 
-    def generate(self):
+    def generate(self, start=None, end=None):
         """Generate a simple src report for the repository.
 
         This method is really just meant to generate a list of events that contain
         all of the contextual information required to provide some sort of insight
         into the branches worked on throughout a day.
+
+        The report includes every day from the ``start`` date (inclusive) to the ``end``
+        date (exclusive), only the current day is included by default. Refs are retrieved
+        from the data store through its timestamp index, so only the refs within the
+        window specified are ever loaded.
         """
-        self.parse()
+        return list(
+            self.stream(
+                start=start,
+                end=end,
+            ),
+        )
 
-        today = date.today()
-        today_refs = []
 
-        for ref in self.parsed.values():
-            ref = copy.deepcopy(ref)
-            ref_timestamp = datetime.strptime(
-                ref["timestamp"],
-                "%Y-%m-%d %H:%M:%S %z",
-            )
+def parse_repositories(repositories, workers):
+    """Parse all of the ``repositories`` specified, each repository's reflog is read and parsed
+    concurrently using a pool of ``workers`` threads, and everything collected is then stored
+    with a single write to the data store.
 
-            if ref_timestamp.date() == today:
-                ref["timestamp"] = ref_timestamp
-                today_refs.append(
-                    ref,
-                )
+    A dictionary mapping each repository to whether or not it was parsed successfully is returned.
+    """
+    parsers = [RepositoryParser(repository) for repository in repositories]
+
+    def collect(parser):
+        try:
+            return parser.collect()
+        except (CalledProcessError, OSError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        collected = list(executor.map(collect, parsers))
+
+    results = {}
+
+    with data.transaction():
+        for parser, result in zip(parsers, collected):
+            if result:
+                parser.store()
+            results[parser.repository] = result is not None
+
+    return results
+
+
+def summarize(repositories, start, end, workers, parse=True):
+    """Summarize the time spent on each branch of the ``repositories`` specified, from the ``start``
+    date (inclusive) to the ``end`` date (exclusive), all repositories are parsed concurrently first
+    unless ``parse`` is ``False`` (the repositories have already been parsed).
+
+    {
+        (<REPOSITORY>, <BRANCH>): <DURATION>,
+    }
 
-        ordered_refs = sorted(
-            today_refs,
-            key=lambda x: x["timestamp"],
+    Events are streamed one day at a time and totalled as they're generated, so
+    summaries over long periods never hold more than a single day's events, days
+    that have been compacted are summarized using their daily totals.
+    """
+    if parse:
+        parse_repositories(
+            repositories=repositories,
+            workers=workers,
         )
+    totals = defaultdict(timedelta)
 
-        events = []
+    for repository in repositories:
+        for event in RepositoryParser(repository).stream(start=start, end=end, parse=False):
+            totals[(repository, event["branch"])] += event["duration"]
 
-        max_index = len(ordered_refs)
-        cur_index = 0
-
-        for i in range(max_index):
-            ref_one = ordered_refs[cur_index]
-            try:
-                ref_two = ordered_refs[cur_index + 1]
-            except IndexError:
-                ref_two = None
-
-            if not ref_two:
-                # No ref two yet means this is the last ref available, we can create
-                # a "pseudo" ref to generate an itinerary entry up until now.
-                ref_two = {
-                    "commit": "pseudo",
-                    "timestamp": datetime.now(tz=ref_one["timestamp"].tzinfo),
-                    "message": "pseudo",
-                    "previous": ref_one["current"],
-                    "current": "pseudo",
-                }
-
-            cur_index += 1
-
-            if config.hardcoded_start_time:
-                hour = HOUR_MAP[config.hardcoded_start_time]
-                if ref_one["timestamp"].hour < hour:
-                    ref_one["timestamp"] = ref_one["timestamp"].replace(
-                        hour=hour,
-                        minute=0,
-                        second=0,
-                        microsecond=0,
-                    )
-            if config.hardcoded_end_time:
-                hour = HOUR_MAP[config.hardcoded_end_time]
-                if ref_two["timestamp"].hour > hour:
-                    ref_two["timestamp"] = ref_two["timestamp"].replace(
-                        hour=hour,
-                        minute=0,
-                        second=0,
-                        microsecond=0,
-                    )
-
-            event = {
-                "start": ref_one["timestamp"],
-                "end": ref_two["timestamp"],
-                "duration": ref_two["timestamp"] - ref_one["timestamp"],
-                "branch": ref_one["current"],
-                "issue": ref_one["current"].split("/")[-1] if "/" in ref_one["current"] else ref_one["current"],
-            }
-
-            if event["duration"] > timedelta(minutes=DURATION_MAP[config.minimum_event_duration]):
-                events.append(
-                    event,
-                )
-        return events
+        for total in data.totals(repository=repository, start=start.isoformat(), end=end.isoformat()):
+            totals[(repository, total["branch"])] += timedelta(seconds=total["duration"])
+
+    return dict(totals)
+
+
+def history_available(repository, start, end):
+    """Return whether or not the refs stored for a ``repository`` cover every day from the ``start``
+    date (inclusive) to the ``end`` date (exclusive).
+
+    Days outside of the retention window, days that have been compacted, and days older than the
+    oldest ref stored (local data deleted, or refs expired from the reflog) are never covered, an
+    empty itinerary for those days means the history is missing, not that nothing was worked on.
+    """
+    if config.retention_weeks and start < date.today() - timedelta(weeks=config.retention_weeks):
+        return False
+
+    oldest = data.oldest(repository)
+
+    if oldest is None or start.isoformat() < oldest:
+        return False
+
+    for _ in data.totals(repository=repository, start=start.isoformat(), end=end.isoformat()):
+        return False
+
+    return True
+
+
+def compact_repositories(repositories, weeks):
+    """Compact the stored history of all of the ``repositories`` specified, keeping only ``weeks``
+    weeks of refs for each repository.
+
+    A dictionary mapping each repository to whether or not anything was compacted is returned.
+    """
+    results = {
+        repository: RepositoryParser(repository).compact(weeks=weeks) for repository in repositories
+    }
+    data.vacuum()
+
+    return results
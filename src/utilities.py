@@ -1,14 +1,51 @@
+import re
 import string
+import importlib
+import threading
 
-from rumps import (
-    alert,
+from functools import (
+    lru_cache,
 )
 
+from src.conf.conf import (
+    ISSUE_PATTERN,
+)
 from src.exceptions import (
     ValidationError,
 )
 
 
+class LazyObject:
+    def __init__(self, module, name):
+        """Initialize a new LazyObject, standing in for the object ``name`` within the ``module``
+        specified, the module is only imported the first time any of the object's attributes are
+        used, so heavy modules (and any singletons they construct) aren't loaded until needed.
+        """
+        self._module = module
+        self._name = name
+        self._object = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Return a boolean representing if the object has been loaded yet.
+        """
+        return self._object is not None
+
+    def load(self):
+        """Load the object, importing it's module if it hasn't been imported yet.
+        """
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = getattr(importlib.import_module(self._module), self._name)
+
+        return self._object
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
 def wait_for_result(window, validators=None, timeout=0.1):
     """Wait for a valid result to be received by the ``window`` specified.
 
@@ -19,6 +56,11 @@ def wait_for_result(window, validators=None, timeout=0.1):
     Any validators passed in will be ran sequentially on the value taken from
     the window instance.
     """
+    # Imported here so utilities can be used without a menu bar available.
+    from rumps import (
+        alert,
+    )
+
     while True:
         result = window.run()
 
@@ -104,3 +146,27 @@ def strfdelta(delta, fmt="{H:02}h {M:02}m {S:02}s", typ="timedelta"):
         if field in desired_fields and field in constants:
             values[field], remainder = divmod(remainder, constants[field])
     return f.format(fmt, **values)
+
+
+@lru_cache(maxsize=None)
+def _compile_issue_pattern(pattern):
+    """Compile an issue ``pattern``, an invalid pattern falls back to the default ``ISSUE_PATTERN``.
+    """
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return re.compile(ISSUE_PATTERN)
+
+
+@lru_cache(maxsize=4096)
+def issue_key(branch, pattern=ISSUE_PATTERN):
+    """Retrieve the issue key found anywhere within a ``branch`` using the ``pattern`` specified,
+    ``None`` is returned for branches that don't represent an issue ("develop", "main", "4.9", etc.)
+
+    Keys are memoized, so each branch is only ever matched once.
+    """
+    match = _compile_issue_pattern(pattern).search(branch)
+
+    if match:
+        return match.group(0)
+    return None
@@ -1,9 +1,15 @@
 import os
 
+from datetime import (
+    datetime,
+)
 from pathlib import (
     Path,
 )
 
+from src.conf.conf import (
+    DATE_FORMAT,
+)
 from src.conf.config import (
     config,
 )
@@ -46,3 +52,15 @@ def validate_repository_duplicate(value):
             title="Duplicate Repository",
             message="That repository is already being tracked.",
         )
+
+
+def validate_date(value):
+    """Validates that the ``value`` specified is a valid date.
+    """
+    try:
+        datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        raise ValidationError(
+            title="Not A Valid Date",
+            message="Please enter a valid date (YYYY-MM-DD).",
+        )
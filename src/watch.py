@@ -0,0 +1,233 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+from src.conf.config import (
+    config,
+)
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks used when watching a repository's "logs" directory,
+# git appends to the HEAD reflog in place, but it can also be re-created
+# entirely (reflog expire, gc), so both cases are watched for.
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_MASK = IN_MODIFY | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+IN_EVENT = struct.Struct("iIII")
+
+# How long (in seconds) a repository's reflog must be left alone before it's
+# parsed, bursts of changes (rebases, etc.) are only ever parsed once.
+DEBOUNCE = 2
+# How often (in seconds) reflogs are checked for changes when they can't be watched
+# through inotify, and how often the watcher checks for changes to its repositories.
+POLL = 2
+
+
+def _reflog(repository):
+    """Retrieve the path to the HEAD reflog of a ``repository``.
+    """
+    return os.path.join(repository, ".git", "logs", "HEAD")
+
+
+class InotifyBackend:
+    def __init__(self):
+        """Initialize a new InotifyBackend, watching reflogs for changes through inotify,
+        an ``OSError`` is raised if inotify isn't available on the current platform.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on linux.")
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify could not be initialized.")
+
+        self.watches = {}
+
+    def add(self, repository):
+        """Watch the reflog of a ``repository``, ``False`` is returned if it can't be watched.
+        """
+        wd = self.libc.inotify_add_watch(
+            self.fd,
+            os.path.dirname(_reflog(repository)).encode(),
+            IN_MASK,
+        )
+        if wd < 0:
+            return False
+
+        self.watches[wd] = repository
+        return True
+
+    def remove(self, repository):
+        """Stop watching the reflog of a ``repository``.
+        """
+        for wd, watched in list(self.watches.items()):
+            if watched == repository:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                self.watches.pop(wd)
+
+    def wait(self, timeout):
+        """Wait up to ``timeout`` seconds for any reflogs to change, returning the
+        repositories whose reflog has changed.
+        """
+        changed = set()
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+
+        try:
+            buff = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(buff):
+            wd, mask, cookie, length = IN_EVENT.unpack_from(buff, offset)
+            name = buff[offset + IN_EVENT.size:offset + IN_EVENT.size + length].rstrip(b"\0")
+            offset += IN_EVENT.size + length
+
+            if name == b"HEAD" and wd in self.watches:
+                changed.add(
+                    self.watches[wd],
+                )
+        return changed
+
+
+class PollingBackend:
+    def __init__(self):
+        """Initialize a new PollingBackend, watching reflogs for changes by checking
+        the size and modification time of each reflog.
+        """
+        self.watches = {}
+
+    @staticmethod
+    def _stat(repository):
+        """Retrieve the (<modified>, <size>) of a ``repository``'s reflog, ``None``
+        is returned if the reflog doesn't exist.
+        """
+        try:
+            stat = os.stat(_reflog(repository))
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    def add(self, repository):
+        """Watch the reflog of a ``repository``, reflogs can always be polled.
+        """
+        self.watches[repository] = self._stat(repository)
+        return True
+
+    def remove(self, repository):
+        """Stop watching the reflog of a ``repository``.
+        """
+        self.watches.pop(repository, None)
+
+    def poll(self):
+        """Check each reflog once, returning the repositories whose reflog has changed.
+        """
+        changed = set()
+
+        for repository, previous in self.watches.items():
+            current = self._stat(repository)
+            if current != previous:
+                self.watches[repository] = current
+                changed.add(
+                    repository,
+                )
+        return changed
+
+
+class RepositoryWatcher(threading.Thread):
+    def __init__(self, callback):
+        """Initialize a new RepositoryWatcher, the watcher runs in a background thread, watching
+        the reflog of every tracked repository and calling ``callback`` with the repositories
+        whose reflog has changed, once their reflog has been left alone for ``DEBOUNCE`` seconds.
+
+        Repositories are watched through inotify when it's available, anything that can't
+        be watched that way falls back to polling, idle repositories are never parsed.
+        """
+        super().__init__(daemon=True)
+
+        self.callback = callback
+        self.stopped = threading.Event()
+        self.polling = PollingBackend()
+        self.pending = {}
+        self.watched = set()
+
+        try:
+            self.inotify = InotifyBackend()
+        except (OSError, AttributeError):
+            self.inotify = None
+
+    def stop(self):
+        """Stop the watcher, any parse currently being done is finished first.
+        """
+        self.stopped.set()
+
+    def sync(self):
+        """Sync up the repositories being watched with the repositories currently tracked,
+        newly tracked repositories are parsed right away to pick up any changes made while
+        they weren't being watched.
+        """
+        repositories = set(config.repositories)
+
+        for repository in self.watched - repositories:
+            if self.inotify:
+                self.inotify.remove(repository)
+            self.polling.remove(repository)
+            self.pending.pop(repository, None)
+
+        for repository in repositories - self.watched:
+            if not (self.inotify and self.inotify.add(repository)):
+                self.polling.add(repository)
+            self.pending[repository] = 0
+
+        self.watched = repositories
+
+    def wait(self):
+        """Wait for any reflogs to change, returning the repositories whose reflog has changed.
+        """
+        changed = set()
+
+        if self.inotify:
+            changed |= self.inotify.wait(timeout=POLL)
+        else:
+            self.stopped.wait(timeout=POLL)
+
+        changed |= self.polling.poll()
+
+        return changed
+
+    def run(self):
+        """Run the watcher until it's stopped.
+        """
+        while not self.stopped.is_set():
+            self.sync()
+
+            for repository in self.wait():
+                self.pending[repository] = time.monotonic()
+
+            now = time.monotonic()
+            ready = [repository for repository, changed in self.pending.items() if now - changed >= DEBOUNCE]
+
+            if ready:
+                for repository in ready:
+                    self.pending.pop(repository)
+                try:
+                    self.callback(ready)
+                except Exception:
+                    # The watcher should never stop because of a single failure,
+                    # the repositories will be parsed again on their next change.
+                    logger.exception("Parsing changed repositories has failed.")